@@ -1,7 +1,7 @@
 import os
 from openai import OpenAI
 from dotenv import load_dotenv
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -67,6 +67,64 @@ class AIGenerator:
             print(f"Error en generación de guía: {e}")
             return f"Error al generar contenido: {str(e)}"
     
+    def generate_grounded_study_guide(self, topic: str, class_name: str, language: str,
+                                      passages: List[Dict], preferences: Optional[Dict] = None) -> str:
+        """
+        Genera una guía de estudio basada solo en pasajes de un PDF del estudiante.
+        `passages` son los fragmentos recuperados ({'page', 'text'}); el prompt
+        queda acotado aunque el documento tenga cientos de páginas.
+        """
+        if preferences is None:
+            preferences = {}
+        
+        format_type = preferences.get('format', 'structured notes')
+        difficulty = preferences.get('difficulty', 'medium')
+        
+        system_msg = """Eres un experto creador de contenido educativo. Construyes guías de
+        estudio a partir del material de clase del estudiante: usas solo la información de
+        los fragmentos que se te dan y citas la página de donde sale cada idea."""
+        
+        sources = "\n\n".join(
+            f"[Página {passage['page']}]\n{passage['text']}" for passage in passages
+        )
+        
+        prompt = f"""
+        Crea una guía de estudio para estudiantes de {class_name} sobre el tema: {topic}
+        
+        Formato: {format_type}
+        Nivel de dificultad: {difficulty}
+        Idioma: {language}
+        
+        Usa SOLO estos fragmentos del PDF de la clase:
+        
+        {sources}
+        
+        DEBE incluir:
+        1. Introducción al tema según el material
+        2. Conceptos clave explicados paso a paso, citando la página (p. ej. "(p. 12)")
+        3. Ejemplos resueltos tomados o adaptados del material
+        4. 5 problemas de práctica (con respuestas al final)
+        5. Resumen de puntos clave
+        
+        Si el material no cubre alguna parte del tema, dilo en vez de inventarla.
+        """
+        
+        try:
+            response = self.client.chat.completions.create(
+                model=self.text_model,
+                messages=[
+                    {"role": "system", "content": system_msg},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=self.temperature,
+                max_tokens=self.max_tokens
+            )
+            
+            return response.choices[0].message.content
+        except Exception as e:
+            print(f"Error en generación de guía con fuentes: {e}")
+            return f"Error al generar contenido: {str(e)}"
+    
     def generate_video_script(self, topic: str, class_name: str, language: str, 
                             duration: int = 300) -> str:
         """Genera un guión para video educativo"""
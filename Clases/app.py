@@ -69,7 +69,11 @@ print("\n" + "="*60)
 # <-- AQUÍ IMPORTAS TUS ROUTERS -->
 from routes.text_routes import router as text_router
 from routes.video_routes import router as video_router
-from routes.pdf_routes import router as pdf_router
+from routes.pdf_routes import router as pdf_router, ingestion_queue
+from routes.admin_routes import router as admin_router
+from streaming.upstream import upstream_pool
+from processing.worker_pool import shutdown_process_pool
+from utils.compression import CompressionMiddleware
 
 # Crear la app
 app = FastAPI(
@@ -90,11 +94,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip/brotli según Accept-Encoding (las variantes precomprimidas pasan sin tocar)
+app.add_middleware(CompressionMiddleware, minimum_size=500)
 
 # Incluir los routers
 app.include_router(text_router)
 app.include_router(video_router)
 app.include_router(pdf_router)
+app.include_router(admin_router)
 
 # --- NUEVO: helper para generar videos en Sora ---
 def generate_video_sora(prompt: str, duration: int = 6, resolution: str = "720p", voice: str | None = None):
@@ -160,6 +167,13 @@ async def sora_generate(request: Request):
     except Exception as e:
         return JSONResponse(status_code=502, content={"ok": False, "error": str(e)})
 
+# Cierra el pool de conexiones de los proxies de streaming
+@app.on_event("shutdown")
+async def shutdown_event():
+    await upstream_pool.aclose()
+    await ingestion_queue.aclose()
+    shutdown_process_pool()
+
 # Handler global para errores
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
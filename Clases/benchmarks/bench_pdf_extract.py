@@ -0,0 +1,109 @@
+"""
+Benchmark: extracción de texto secuencial vs. en paralelo (pool de procesos)
+
+Genera PDFs sintéticos de 10, 100 y 500 páginas con texto y compara el tiempo
+de reloj de pdfplumber página por página en un núcleo (como extraía el
+servicio originalmente) contra `extract_pages_parallel` (backends escalonados
+en el pool de procesos).
+
+Uso (desde Clases/):
+    python benchmarks/bench_pdf_extract.py [--pages 10 100 500] [--lines 40]
+"""
+
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import pdfplumber
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from processing.pdf_text import extract_pages_parallel, extractor_stats
+from processing.worker_pool import PDF_WORKERS, get_process_pool, shutdown_process_pool
+
+
+def build_pdf(page_count: int, lines_per_page: int) -> bytes:
+    """PDF mínimo con `lines_per_page` líneas de texto Helvetica por página"""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(page_count)), page_count
+        ),
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i in range(page_count):
+        lines = [
+            f"({'Pagina %d linea %d: el teorema de Pitagoras relaciona los lados de un triangulo' % (i + 1, n)}) Tj 0 -16 Td"
+            for n in range(lines_per_page)
+        ]
+        content = "BT /F1 10 Tf 40 760 Td " + " ".join(lines) + " ET"
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(content)} >>\nstream\n{content}\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def extract_pdfplumber(path: Path):
+    """Línea base: pdfplumber secuencial, sin fast path ni procesos"""
+    started = time.perf_counter()
+    with pdfplumber.open(path) as pdf:
+        pages = [page.extract_text() or "" for page in pdf.pages]
+    return pages, time.perf_counter() - started
+
+
+async def run(page_counts, lines_per_page):
+    print(f"⚙️ Procesos en el pool: {PDF_WORKERS}")
+    # Arranca los procesos antes de medir para no contar el fork
+    await asyncio.gather(*(
+        asyncio.get_running_loop().run_in_executor(get_process_pool(), abs, 0)
+        for _ in range(PDF_WORKERS)
+    ))
+
+    print(f"\n{'páginas':>8} {'pdfplumber':>12} {'paralelo':>12} {'speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for page_count in page_counts:
+            path = Path(tmp) / f"bench_{page_count}.pdf"
+            path.write_bytes(build_pdf(page_count, lines_per_page))
+
+            serial_pages, serial_seconds = extract_pdfplumber(path)
+            parallel_pages, parallel_seconds = await extract_pages_parallel(path)
+            # Los backends difieren en espacios: se compara el texto sin ellos
+            assert [''.join(p.split()) for p in serial_pages] == [''.join(p.split()) for p in parallel_pages], \
+                "El texto en paralelo no coincide con el de pdfplumber"
+
+            print(f"{page_count:>8} {serial_seconds:>11.2f}s {parallel_seconds:>11.2f}s "
+                  f"{serial_seconds / parallel_seconds:>8.1f}x")
+
+    print("\nPor backend:")
+    for name, backend in extractor_stats.snapshot().items():
+        print(f"   {name:<11} {backend['pages']:>6} páginas  {backend['ms_per_page']:>7.2f} ms/página")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--lines', type=int, default=40, help="líneas de texto por página")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run(args.pages, args.lines))
+    finally:
+        shutdown_process_pool()
+
+
+if __name__ == "__main__":
+    main()
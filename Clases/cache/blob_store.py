@@ -0,0 +1,286 @@
+import os
+import time
+import uuid
+import json
+import sqlite3
+import hashlib
+from pathlib import Path
+from typing import Optional, Dict, BinaryIO, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_BLOB_DIR = Path(__file__).resolve().parents[1] / "blobstore"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3  # 2 GB
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BlobWriter:
+    """
+    Escritura incremental de un blob: los bytes van a un archivo temporal
+    mientras se calcula el sha256. `commit()` lo mueve a su ruta final
+    (deduplicando), `abort()` lo descarta.
+    """
+
+    def __init__(self, store: "BlobStore", content_type: Optional[str], pinned: bool):
+        self.store = store
+        self.content_type = content_type
+        self.pinned = pinned
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._tmp_path = store.tmp_dir / f"{uuid.uuid4().hex}.part"
+        self._file = self._tmp_path.open("wb")
+        self.closed = False
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self.size += len(chunk)
+
+    @property
+    def sha256(self) -> str:
+        """sha256 de lo escrito hasta ahora"""
+        return self._hash.hexdigest()
+
+    def commit(self) -> str:
+        """Cierra el archivo, lo registra en el índice y devuelve su sha256"""
+        self._file.close()
+        self.closed = True
+        sha = self._hash.hexdigest()
+        self.store._commit_file(self._tmp_path, sha, self.size, self.content_type, self.pinned)
+        return sha
+
+    def abort(self):
+        if self.closed:
+            return
+        self._file.close()
+        self.closed = True
+        self._tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Si hubo excepción o no se hizo commit, el temporal se descarta
+        self.abort()
+
+
+class BlobStore:
+    """
+    Almacén local de blobs direccionado por contenido (sha256).
+
+    - Archivos en directorios fragmentados: <root>/ab/cd/abcd...
+    - Índice SQLite con tamaño, tipo y último acceso de cada blob
+    - Presupuesto total de bytes con expulsión LRU (los blobs `pinned`,
+      como los PDFs subidos por usuarios, nunca se expulsan)
+    - Referencias con nombre (`refs`) que apuntan a un sha: URL -> PDF,
+      upload -> PDF, etc. Varias referencias pueden compartir un blob.
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.root = Path(root or os.getenv('BLOB_STORE_DIR', DEFAULT_BLOB_DIR))
+        self.max_bytes = int(max_bytes or os.getenv('BLOB_STORE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.root / "index.sqlite3"
+        self._init_db()
+
+    # ==================== ÍNDICE ====================
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS blobs (
+                    sha TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    content_type TEXT,
+                    pinned INTEGER NOT NULL DEFAULT 0,
+                    created REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_blobs_lru ON blobs (pinned, last_access)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS refs (
+                    ref TEXT PRIMARY KEY,
+                    sha TEXT NOT NULL,
+                    meta TEXT,
+                    created REAL NOT NULL,
+                    expires REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_refs_sha ON refs (sha)")
+
+    # ==================== BLOBS ====================
+
+    def path_for(self, sha: str) -> Path:
+        return self.root / sha[:2] / sha[2:4] / sha
+
+    def open_writer(self, content_type: Optional[str] = None, pinned: bool = False) -> BlobWriter:
+        return BlobWriter(self, content_type, pinned)
+
+    def put_bytes(self, data: bytes, content_type: Optional[str] = None, pinned: bool = False) -> str:
+        with self.open_writer(content_type, pinned) as writer:
+            writer.write(data)
+            return writer.commit()
+
+    def put_file(self, fileobj: BinaryIO, content_type: Optional[str] = None, pinned: bool = False) -> str:
+        """Copia un archivo abierto al almacén en trozos y devuelve su sha256"""
+        with self.open_writer(content_type, pinned) as writer:
+            while True:
+                chunk = fileobj.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            return writer.commit()
+
+    def _commit_file(self, tmp_path: Path, sha: str, size: int,
+                     content_type: Optional[str], pinned: bool):
+        final_path = self.path_for(sha)
+        if final_path.exists():
+            # Mismo contenido ya almacenado: una sola copia en disco
+            tmp_path.unlink(missing_ok=True)
+        else:
+            final_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, final_path)
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO blobs (sha, size, content_type, pinned, created, last_access)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(sha) DO UPDATE SET
+                    pinned = MAX(pinned, excluded.pinned),
+                    content_type = COALESCE(blobs.content_type, excluded.content_type),
+                    last_access = excluded.last_access
+            """, (sha, size, content_type, int(pinned), now, now))
+        # El blob recién escrito nunca se expulsa en su propio commit
+        self._enforce_budget(keep=sha)
+
+    def info(self, sha: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM blobs WHERE sha = ?", (sha,)).fetchone()
+        return dict(row) if row else None
+
+    def get_path(self, sha: str) -> Optional[Path]:
+        """Ruta del blob en disco (y marca el acceso para el LRU) o None"""
+        path = self.path_for(sha)
+        if not path.exists():
+            self._forget(sha)
+            return None
+        with self._connect() as conn:
+            conn.execute("UPDATE blobs SET last_access = ? WHERE sha = ?", (time.time(), sha))
+        return path
+
+    def pin(self, sha: str):
+        with self._connect() as conn:
+            conn.execute("UPDATE blobs SET pinned = 1 WHERE sha = ?", (sha,))
+
+    def delete(self, sha: str):
+        self.path_for(sha).unlink(missing_ok=True)
+        self._forget(sha)
+
+    def _forget(self, sha: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM blobs WHERE sha = ?", (sha,))
+            conn.execute("DELETE FROM refs WHERE sha = ?", (sha,))
+
+    def _enforce_budget(self, keep: Optional[str] = None):
+        """
+        Expulsa blobs no fijados, del menos reciente al más reciente, hasta caber
+        en el presupuesto. `keep` (el blob que se acaba de guardar) no se toca.
+        """
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            candidates = conn.execute(
+                "SELECT sha, size FROM blobs WHERE pinned = 0 AND sha != ? ORDER BY last_access ASC",
+                (keep or '',)
+            ).fetchall()
+
+        for row in candidates:
+            if total <= self.max_bytes:
+                break
+            self.delete(row['sha'])
+            total -= row['size']
+            print(f"🧹 Blob expulsado (LRU): {row['sha'][:12]}... ({row['size']} bytes)")
+
+    def usage(self) -> Dict:
+        with self._connect() as conn:
+            row = conn.execute("""
+                SELECT COUNT(*) AS blobs,
+                       COALESCE(SUM(size), 0) AS bytes,
+                       COALESCE(SUM(CASE WHEN pinned = 1 THEN size ELSE 0 END), 0) AS pinned_bytes
+                FROM blobs
+            """).fetchone()
+            refs = conn.execute("SELECT COUNT(*) FROM refs").fetchone()[0]
+        return {
+            'blobs': row['blobs'],
+            'bytes': row['bytes'],
+            'pinned_bytes': row['pinned_bytes'],
+            'max_bytes': self.max_bytes,
+            'refs': refs
+        }
+
+    # ==================== REFERENCIAS ====================
+
+    def link(self, ref: str, sha: str, meta: Optional[Dict] = None, ttl: Optional[int] = None):
+        """Asocia un nombre (URL, upload, ...) a un blob, opcionalmente con TTL en segundos"""
+        now = time.time()
+        expires = now + ttl if ttl else None
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO refs (ref, sha, meta, created, expires) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(ref) DO UPDATE SET
+                    sha = excluded.sha, meta = excluded.meta,
+                    created = excluded.created, expires = excluded.expires
+            """, (ref, sha, json.dumps(meta) if meta is not None else None, now, expires))
+
+    def resolve(self, ref: str) -> Optional[Dict]:
+        """
+        Devuelve {'sha', 'size', 'content_type', 'meta', 'path'} de una referencia
+        vigente cuyo blob sigue en disco, o None.
+        """
+        with self._connect() as conn:
+            row = conn.execute("""
+                SELECT refs.sha, refs.meta, refs.expires, blobs.size, blobs.content_type
+                FROM refs JOIN blobs ON blobs.sha = refs.sha
+                WHERE refs.ref = ?
+            """, (ref,)).fetchone()
+        if not row:
+            return None
+        if row['expires'] is not None and row['expires'] < time.time():
+            self.unlink(ref)
+            return None
+        path = self.get_path(row['sha'])
+        if path is None:
+            return None
+        return {
+            'sha': row['sha'],
+            'size': row['size'],
+            'content_type': row['content_type'],
+            'meta': json.loads(row['meta']) if row['meta'] else None,
+            'path': path
+        }
+
+    def refs_for(self, sha: str, prefix: str = '') -> List[str]:
+        """Referencias vigentes que apuntan a un blob (opcionalmente con un prefijo)"""
+        with self._connect() as conn:
+            rows = conn.execute("""
+                SELECT ref FROM refs
+                WHERE sha = ? AND substr(ref, 1, ?) = ? AND (expires IS NULL OR expires >= ?)
+                ORDER BY created
+            """, (sha, len(prefix), prefix, time.time())).fetchall()
+        return [row['ref'] for row in rows]
+
+    def unlink(self, ref: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM refs WHERE ref = ?", (ref,))
+
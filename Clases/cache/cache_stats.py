@@ -0,0 +1,110 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class CacheStats:
+    """
+    Contadores de cache por namespace (prefijo de la key: text, videos, pdf...)
+
+    Registra hits, misses, latencia, bytes leídos/escritos y evictions.
+    Las evictions se infieren: una key que escribimos con TTL y que falta
+    antes de expirar fue sacada por Redis (maxmemory) o borrada por fuera.
+    """
+
+    def __init__(self, max_tracked_keys: int = 10000):
+        self._lock = threading.Lock()
+        self._namespaces: Dict[str, Dict] = {}
+        # key -> timestamp de expiración, acotado para no crecer sin límite
+        self._expiries: "OrderedDict[str, float]" = OrderedDict()
+        self.max_tracked_keys = max_tracked_keys
+        self.started_at = time.time()
+
+    @staticmethod
+    def namespace(key: str) -> str:
+        """Prefijo de la key hasta el primer ':'"""
+        return key.split(':', 1)[0] if ':' in key else key
+
+    def _ns(self, key: str) -> Dict:
+        name = self.namespace(key)
+        if name not in self._namespaces:
+            self._namespaces[name] = {
+                'hits': 0,
+                'misses': 0,
+                'sets': 0,
+                'deletes': 0,
+                'evictions': 0,
+                'errors': 0,
+                'bytes_read': 0,
+                'bytes_written': 0,
+                'ops': 0,
+                'latency_ms_total': 0.0,
+                'latency_ms_max': 0.0,
+            }
+        return self._namespaces[name]
+
+    def _latency(self, ns: Dict, latency_ms: float):
+        ns['ops'] += 1
+        ns['latency_ms_total'] += latency_ms
+        if latency_ms > ns['latency_ms_max']:
+            ns['latency_ms_max'] = latency_ms
+
+    def record_get(self, key: str, value: Optional[bytes], latency_ms: float):
+        with self._lock:
+            ns = self._ns(key)
+            self._latency(ns, latency_ms)
+            if value is None:
+                ns['misses'] += 1
+                expiry = self._expiries.pop(key, None)
+                if expiry is not None and expiry > time.time():
+                    ns['evictions'] += 1
+            else:
+                ns['hits'] += 1
+                ns['bytes_read'] += len(value) if isinstance(value, (bytes, str)) else 0
+
+    def record_set(self, key: str, value, ttl: int, latency_ms: float):
+        with self._lock:
+            ns = self._ns(key)
+            self._latency(ns, latency_ms)
+            ns['sets'] += 1
+            ns['bytes_written'] += len(value) if isinstance(value, (bytes, str)) else 0
+            self._expiries[key] = time.time() + ttl
+            self._expiries.move_to_end(key)
+            while len(self._expiries) > self.max_tracked_keys:
+                self._expiries.popitem(last=False)
+
+    def record_delete(self, key: str, latency_ms: float):
+        with self._lock:
+            ns = self._ns(key)
+            self._latency(ns, latency_ms)
+            ns['deletes'] += 1
+            self._expiries.pop(key, None)
+
+    def record_error(self, key: str):
+        with self._lock:
+            self._ns(key)['errors'] += 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Copia de los contadores con hit rate y latencia promedio calculados"""
+        with self._lock:
+            result = {}
+            for name, ns in self._namespaces.items():
+                lookups = ns['hits'] + ns['misses']
+                data = dict(ns)
+                data['hit_rate'] = round(ns['hits'] / lookups, 4) if lookups else None
+                data['latency_ms_avg'] = round(ns['latency_ms_total'] / ns['ops'], 3) if ns['ops'] else None
+                data['latency_ms_total'] = round(ns['latency_ms_total'], 3)
+                data['latency_ms_max'] = round(ns['latency_ms_max'], 3)
+                result[name] = data
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._namespaces.clear()
+            self._expiries.clear()
+            self.started_at = time.time()
+
+
+# Compartido por todas las instancias de RedisCache del proceso
+cache_stats = CacheStats()
@@ -0,0 +1,228 @@
+import os
+import re
+import html
+import json
+import time
+import sqlite3
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from cache.blob_store import DEFAULT_BLOB_DIR
+
+# Marcas del snippet de FTS5 (uso privado de Unicode: no aparecen en el texto)
+MARK_START, MARK_END = '\ue000', '\ue001'
+# Filas que se piden por vuelta cuando `keep` descarta resultados
+SEARCH_BATCH = 100
+
+
+class PDFTextStore:
+    """
+    Texto extraído de PDFs, guardado por página y por sha256 del contenido.
+
+    Como la clave es el hash, un PDF se extrae una sola vez aunque se suba con
+    otros nombres, y si el contenido cambia la clave cambia sola (no hace
+    falta invalidar a mano).
+
+    Cada página también entra a un índice FTS5 (`pages_fts`) para búsqueda
+    de texto completo por página, sin distinguir acentos ni mayúsculas.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        root = Path(os.getenv('BLOB_STORE_DIR', DEFAULT_BLOB_DIR))
+        self.db_path = Path(db_path or os.getenv('PDF_TEXT_DB', root / "pdf_text.sqlite3"))
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    sha TEXT PRIMARY KEY,
+                    page_count INTEGER NOT NULL,
+                    chars INTEGER NOT NULL,
+                    extract_seconds REAL,
+                    created REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    sha TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    PRIMARY KEY (sha, page)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS metadata (
+                    sha TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            has_index = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'pages_fts'"
+            ).fetchone() is not None
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+                    text, sha UNINDEXED, page UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
+            if not has_index:
+                # Índice nuevo sobre una base existente: se llena con lo ya extraído
+                conn.execute("INSERT INTO pages_fts (text, sha, page) SELECT text, sha, page FROM pages")
+
+    def has(self, sha: str) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM documents WHERE sha = ?", (sha,)).fetchone() is not None
+
+    def document(self, sha: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM documents WHERE sha = ?", (sha,)).fetchone()
+        return dict(row) if row else None
+
+    def get_pages(self, sha: str, indices: Optional[List[int]] = None) -> Optional[List[str]]:
+        """
+        Texto de las páginas (todas, o `indices` desde 0 en ese orden),
+        o None si el PDF no se ha extraído.
+        """
+        with self._connect() as conn:
+            if conn.execute("SELECT 1 FROM documents WHERE sha = ?", (sha,)).fetchone() is None:
+                return None
+            if indices is None:
+                rows = conn.execute("SELECT text FROM pages WHERE sha = ? ORDER BY page", (sha,)).fetchall()
+                return [row['text'] for row in rows]
+            texts = {}
+            # Por lotes para no pasar el límite de parámetros de SQLite
+            for start in range(0, len(indices), 500):
+                batch = indices[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT page, text FROM pages WHERE sha = ? AND page IN ({','.join('?' * len(batch))})",
+                    (sha, *batch)
+                ).fetchall()
+                texts.update((row['page'], row['text']) for row in rows)
+        return [texts.get(index, "") for index in indices]
+
+    def put_pages(self, sha: str, pages: List[str], extract_seconds: Optional[float] = None):
+        """Guarda el texto de un PDF (páginas desde 0) reemplazando lo anterior"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pages WHERE sha = ?", (sha,))
+            conn.execute("DELETE FROM pages_fts WHERE sha = ?", (sha,))
+            rows = [(sha, i, text) for i, text in enumerate(pages)]
+            conn.executemany("INSERT INTO pages (sha, page, text) VALUES (?, ?, ?)", rows)
+            conn.executemany(
+                "INSERT INTO pages_fts (sha, page, text) VALUES (?, ?, ?)",
+                [row for row in rows if row[2].strip()]
+            )
+            conn.execute("""
+                INSERT OR REPLACE INTO documents (sha, page_count, chars, extract_seconds, created)
+                VALUES (?, ?, ?, ?, ?)
+            """, (sha, len(pages), sum(len(t) for t in pages), extract_seconds, time.time()))
+
+    def page_lengths(self, sha: str) -> List[int]:
+        """Caracteres de texto de cada página, en orden"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT length(text) AS chars FROM pages WHERE sha = ? ORDER BY page", (sha,)).fetchall()
+        return [row['chars'] for row in rows]
+
+    def get_metadata(self, sha: str) -> Optional[Dict]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM metadata WHERE sha = ?", (sha,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def put_metadata(self, sha: str, data: Dict):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO metadata (sha, data, created) VALUES (?, ?, ?)",
+                (sha, json.dumps(data, ensure_ascii=False), time.time())
+            )
+
+    def delete(self, sha: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pages WHERE sha = ?", (sha,))
+            conn.execute("DELETE FROM pages_fts WHERE sha = ?", (sha,))
+            conn.execute("DELETE FROM metadata WHERE sha = ?", (sha,))
+            conn.execute("DELETE FROM documents WHERE sha = ?", (sha,))
+
+    # ==================== BÚSQUEDA ====================
+
+    @staticmethod
+    def match_query(query: str) -> Optional[str]:
+        """
+        Convierte texto libre en una consulta FTS5 segura: cada palabra entre
+        comillas (todas deben aparecer); lo que venga entre comillas dobles se
+        busca como frase exacta.
+        """
+        terms = []
+        for phrase, word in re.findall(r'"([^"]+)"|(\w+)', query):
+            if phrase:
+                words = re.findall(r'\w+', phrase)
+                if words:
+                    terms.append('"' + ' '.join(words) + '"')
+            else:
+                terms.append(f'"{word}"')
+        return ' '.join(terms) or None
+
+    def search(self, query: str, limit: int = 20, offset: int = 0,
+               keep: Optional[Callable[[str], bool]] = None) -> List[Dict]:
+        """
+        Páginas que contienen `query`, de más a menos relevante (BM25).
+
+        `keep(sha)` descarta documentos (p. ej. sin subidas vigentes); `limit`
+        y `offset` cuentan solo las páginas que quedan, así la paginación no
+        tiene huecos. El snippet viene escapado como HTML, con `<mark>` en
+        los términos encontrados.
+
+        Returns:
+            [{'sha', 'page' (desde 1), 'snippet', 'score'}]
+        """
+        match = self.match_query(query)
+        if match is None:
+            return []
+        hits: List[Dict] = []
+        skipped = 0
+        batch = max(limit + offset, SEARCH_BATCH)
+        kept: Dict[str, bool] = {}
+        with self._connect() as conn:
+            cursor = 0
+            while len(hits) < limit:
+                rows = conn.execute("""
+                    SELECT sha, page,
+                           snippet(pages_fts, 0, ?, ?, '…', 16) AS snippet,
+                           bm25(pages_fts) AS rank
+                    FROM pages_fts
+                    WHERE pages_fts MATCH ?
+                    ORDER BY rank
+                    LIMIT ? OFFSET ?
+                """, (MARK_START, MARK_END, match, batch, cursor)).fetchall()
+                for row in rows:
+                    if keep is not None:
+                        if row['sha'] not in kept:
+                            kept[row['sha']] = keep(row['sha'])
+                        if not kept[row['sha']]:
+                            continue
+                    if skipped < offset:
+                        skipped += 1
+                        continue
+                    hits.append({
+                        'sha': row['sha'],
+                        'page': row['page'] + 1,
+                        'snippet': self._snippet_html(row['snippet']),
+                        'score': round(-row['rank'], 6)
+                    })
+                    if len(hits) == limit:
+                        break
+                if len(rows) < batch:
+                    break
+                cursor += batch
+        return hits
+
+    @staticmethod
+    def _snippet_html(snippet: str) -> str:
+        # El texto viene del PDF: se escapa antes de poner las marcas
+        return html.escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
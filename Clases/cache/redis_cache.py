@@ -1,11 +1,34 @@
 import redis
 import os
 import json
-from typing import Optional, Any
+import time
+import math
+import uuid
+import random
+import hashlib
+from typing import Optional, Any, Dict, List, Iterable, Iterator, Callable, Tuple
 from dotenv import load_dotenv
+from cache.cache_stats import cache_stats
+from utils.conditional import json_digest
 
 load_dotenv()
 
+# Tamaño de cada trozo de un blob grande (PDFs, media)
+BLOB_CHUNK_SIZE = 512 * 1024
+# Trozos por round trip al escribir/leer un blob
+BLOB_BATCH_CHUNKS = 8
+# Un resultado vacío se guarda solo unos segundos: alcanza para que los que
+# esperaban el lock lo reciban sin recalcular, y no tapa datos nuevos
+EMPTY_RESULT_TTL = 30
+
+# Borra el lock solo si sigue siendo nuestro (no el de otro proceso tras expirar)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
 class RedisCache:
     def __init__(self):
         self.client = redis.Redis(
@@ -14,34 +37,99 @@ class RedisCache:
             db=0,
             decode_responses=False  # Keep as bytes for binary data
         )
+        self.stats = cache_stats
     
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
+        start = time.perf_counter()
         try:
             value = self.client.get(key)
+            self.stats.record_get(key, value, (time.perf_counter() - start) * 1000)
             return value
         except Exception as e:
+            self.stats.record_error(key)
             print(f"Cache get error: {e}")
             return None
     
     def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
         """Set value in cache with TTL (time to live in seconds)"""
+        start = time.perf_counter()
         try:
             self.client.setex(key, ttl, value)
+            self.stats.record_set(key, value, ttl, (time.perf_counter() - start) * 1000)
             return True
         except Exception as e:
+            self.stats.record_error(key)
             print(f"Cache set error: {e}")
             return False
     
     def delete(self, key: str) -> bool:
         """Delete key from cache"""
+        start = time.perf_counter()
         try:
             self.client.delete(key)
+            self.stats.record_delete(key, (time.perf_counter() - start) * 1000)
             return True
         except Exception as e:
+            self.stats.record_error(key)
             print(f"Cache delete error: {e}")
             return False
     
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """Get several values in one round trip (MGET). Missing keys are omitted"""
+        if not keys:
+            return {}
+        start = time.perf_counter()
+        try:
+            values = self.client.mget(keys)
+            # La latencia del round trip se reparte entre las keys del lote
+            latency_ms = (time.perf_counter() - start) * 1000 / len(keys)
+            for k, v in zip(keys, values):
+                self.stats.record_get(k, v, latency_ms)
+            return {k: v for k, v in zip(keys, values) if v is not None}
+        except Exception as e:
+            for k in keys:
+                self.stats.record_error(k)
+            print(f"Cache get_many error: {e}")
+            return {}
+    
+    def set_many(self, mapping: Dict[str, Any], ttl: int = 3600) -> bool:
+        """Set several values with the same TTL in one pipelined round trip"""
+        if not mapping:
+            return True
+        start = time.perf_counter()
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            for key, value in mapping.items():
+                pipe.setex(key, ttl, value)
+            pipe.execute()
+            latency_ms = (time.perf_counter() - start) * 1000 / len(mapping)
+            for key, value in mapping.items():
+                self.stats.record_set(key, value, ttl, latency_ms)
+            return True
+        except Exception as e:
+            for key in mapping:
+                self.stats.record_error(key)
+            print(f"Cache set_many error: {e}")
+            return False
+    
+    def delete_many(self, keys: List[str]) -> bool:
+        """Delete several keys in one round trip"""
+        if not keys:
+            return True
+        start = time.perf_counter()
+        try:
+            self.client.delete(*keys)
+            latency_ms = (time.perf_counter() - start) * 1000 / len(keys)
+            for key in keys:
+                self.stats.record_delete(key, latency_ms)
+            return True
+        except Exception as e:
+            for key in keys:
+                self.stats.record_error(key)
+            print(f"Cache delete_many error: {e}")
+            return False
+    
     def get_json(self, key: str) -> Optional[dict]:
         """Get JSON value from cache"""
         value = self.get(key)
@@ -61,9 +149,364 @@ class RedisCache:
             print(f"Cache set JSON error: {e}")
             return False
     
+    def get_many_json(self, keys: List[str]) -> Dict[str, Any]:
+        """Get several JSON values in one round trip. Missing or invalid keys are omitted"""
+        results = {}
+        for key, value in self.get_many(keys).items():
+            try:
+                results[key] = json.loads(value.decode('utf-8'))
+            except:
+                continue
+        return results
+    
+    def set_many_json(self, mapping: Dict[str, Any], ttl: int = 3600) -> bool:
+        """Set several JSON values with the same TTL in one round trip"""
+        try:
+            encoded = {k: json.dumps(v).encode('utf-8') for k, v in mapping.items()}
+        except Exception as e:
+            print(f"Cache set_many JSON error: {e}")
+            return False
+        return self.set_many(encoded, ttl)
+    
     def exists(self, key: str) -> bool:
         """Check if key exists in cache"""
         try:
             return self.client.exists(key) > 0
         except:
-            return False
\ No newline at end of file
+            return False
+    
+    def sample_keys(self, prefix: str, sample_size: int = 50) -> Dict:
+        """
+        Muestra de keys de un namespace con su tamaño en memoria y TTL restante.
+        Usa SCAN (no bloquea Redis como KEYS) y un pipeline para MEMORY USAGE/TTL.
+        """
+        try:
+            keys = []
+            for key in self.client.scan_iter(match=f"{prefix}:*", count=500):
+                keys.append(key)
+                if len(keys) >= sample_size:
+                    break
+            
+            pipe = self.client.pipeline(transaction=False)
+            for key in keys:
+                pipe.memory_usage(key)
+                pipe.ttl(key)
+            raw = pipe.execute() if keys else []
+            
+            samples = []
+            for i, key in enumerate(keys):
+                size, ttl = raw[2 * i], raw[2 * i + 1]
+                samples.append({
+                    'key': key.decode('utf-8', errors='replace'),
+                    'bytes': size or 0,
+                    'ttl': ttl
+                })
+            
+            sizes = [s['bytes'] for s in samples]
+            ttls = [s['ttl'] for s in samples if s['ttl'] is not None and s['ttl'] >= 0]
+            return {
+                'prefix': prefix,
+                'sampled': len(samples),
+                'bytes_avg': round(sum(sizes) / len(sizes), 1) if sizes else None,
+                'bytes_max': max(sizes) if sizes else None,
+                'ttl_min': min(ttls) if ttls else None,
+                'ttl_avg': round(sum(ttls) / len(ttls), 1) if ttls else None,
+                'ttl_max': max(ttls) if ttls else None,
+                'samples': samples
+            }
+        except Exception as e:
+            print(f"Cache sample error: {e}")
+            return {'prefix': prefix, 'sampled': 0, 'error': str(e), 'samples': []}
+    
+    def server_stats(self) -> Dict:
+        """Contadores globales de Redis (memoria, evictions, expiraciones)"""
+        try:
+            info = self.client.info()
+            return {
+                'used_memory': info.get('used_memory'),
+                'maxmemory': info.get('maxmemory'),
+                'maxmemory_policy': info.get('maxmemory_policy'),
+                'evicted_keys': info.get('evicted_keys'),
+                'expired_keys': info.get('expired_keys'),
+                'keyspace_hits': info.get('keyspace_hits'),
+                'keyspace_misses': info.get('keyspace_misses')
+            }
+        except Exception as e:
+            print(f"Cache info error: {e}")
+            return {'error': str(e)}
+    
+    # ==================== PROTECCIÓN CONTRA ESTAMPIDAS ====================
+    
+    def _acquire_lock(self, key: str, ttl: int) -> Optional[str]:
+        """Lock de reconstrucción de corta vida (SET NX EX). Devuelve el token o None"""
+        token = uuid.uuid4().hex
+        try:
+            if self.client.set(f"{key}:lock", token, nx=True, ex=ttl):
+                return token
+            return None
+        except Exception as e:
+            # Sin Redis no hay coordinación posible: cada request reconstruye
+            print(f"Cache lock error: {e}")
+            return token
+    
+    def _release_lock(self, key: str, token: str):
+        try:
+            self.client.eval(RELEASE_LOCK_SCRIPT, 1, f"{key}:lock", token)
+        except Exception as e:
+            print(f"Cache unlock error: {e}")
+    
+    def _rebuild_json(self, key: str, compute: Callable[[], Any], ttl: int,
+                      grace: int, cache_empty: bool) -> Tuple[Any, bool, str]:
+        start = time.time()
+        value = compute()
+        delta = time.time() - start
+        # Hash del contenido guardado junto al valor: sirve de ETag fuerte
+        etag = json_digest(value)
+        if value or cache_empty:
+            envelope = {'v': value, 'delta': delta, 'expiry': time.time() + ttl, 'etag': etag}
+            # Se guarda más allá del TTL lógico para servir el valor anterior
+            # mientras un solo request lo reconstruye
+            self.set_json(key, envelope, ttl=ttl + grace)
+        else:
+            # Envelope negativo de vida corta, sin gracia: al vencer se vuelve a calcular
+            envelope = {'v': value, 'delta': delta, 'expiry': time.time() + EMPTY_RESULT_TTL, 'etag': etag}
+            self.set_json(key, envelope, ttl=EMPTY_RESULT_TTL)
+        return value, False, etag
+    
+    def _lock_held(self, key: str) -> bool:
+        try:
+            return bool(self.client.exists(f"{key}:lock"))
+        except Exception as e:
+            print(f"Cache lock error: {e}")
+            return False
+    
+    @staticmethod
+    def _from_envelope(envelope: Dict) -> Tuple[Any, bool, str]:
+        etag = envelope.get('etag') or json_digest(envelope['v'])
+        return envelope['v'], True, etag
+    
+    def get_or_compute_json(self, key: str, compute: Callable[[], Any], ttl: int = 3600,
+                            beta: float = 1.0, lock_ttl: int = 30, wait_timeout: float = 5.0,
+                            cache_empty: bool = False) -> Tuple[Any, bool, str]:
+        """
+        Lee un valor JSON o lo calcula con `compute`, evitando estampidas.
+        
+        - Refresco temprano probabilístico (XFetch): cuanto más cerca de expirar
+          y más caro de calcular (`delta`), más probable que un request lo
+          refresque antes de tiempo.
+        - Lock de reconstrucción: solo un request recalcula; los demás reciben
+          el valor anterior, o esperan hasta `wait_timeout` si no hay ninguno
+          (o hasta que el lock se libere sin dejar valor).
+        - Un resultado vacío sin `cache_empty` se guarda `EMPTY_RESULT_TTL`
+          segundos, así los que esperaban no lo recalculan.
+        - Si `compute` falla y hay un valor anterior, se sirve ese; la excepción
+          solo se propaga cuando no hay nada que servir.
+        
+        Returns:
+            (valor, from_cache, etag) donde etag es el sha256 del contenido
+        """
+        grace = max(60, ttl // 4)
+        envelope = self.get_json(key)
+        
+        if envelope and 'v' in envelope:
+            early = envelope.get('delta', 0) * beta * math.log(1.0 - random.random())
+            if time.time() - early < envelope.get('expiry', 0):
+                return self._from_envelope(envelope)
+            
+            token = self._acquire_lock(key, lock_ttl)
+            if not token:
+                return self._from_envelope(envelope)
+            try:
+                return self._rebuild_json(key, compute, ttl, grace, cache_empty)
+            except Exception as e:
+                # Falló el refresco pero hay un valor anterior: se sirve ese
+                print(f"Cache rebuild error ({key}), sirviendo valor anterior: {e}")
+                return self._from_envelope(envelope)
+            finally:
+                self._release_lock(key, token)
+        
+        # Miss total: uno reconstruye, el resto espera su resultado
+        token = self._acquire_lock(key, lock_ttl)
+        if not token:
+            deadline = time.time() + wait_timeout
+            while time.time() < deadline:
+                time.sleep(0.05)
+                envelope = self.get_json(key)
+                if envelope and 'v' in envelope:
+                    return self._from_envelope(envelope)
+                if not self._lock_held(key):
+                    # El que reconstruía terminó sin guardar nada (p. ej. falló): no se espera más
+                    break
+            value = compute()
+            return value, False, json_digest(value)
+        try:
+            return self._rebuild_json(key, compute, ttl, grace, cache_empty)
+        finally:
+            self._release_lock(key, token)
+    
+    # ==================== BLOBS EN TROZOS ====================
+    
+    @staticmethod
+    def _blob_manifest_key(key: str) -> str:
+        return f"{key}:manifest"
+    
+    @staticmethod
+    def _blob_chunk_key(key: str, index: int) -> str:
+        return f"{key}:chunk:{index}"
+    
+    def set_blob(self, key: str, data: bytes, ttl: int = 3600,
+                 chunk_size: int = BLOB_CHUNK_SIZE, content_type: Optional[str] = None) -> bool:
+        """Guarda un blob grande como trozos de tamaño fijo más una key de manifiesto"""
+        chunks = (data[i:i + chunk_size] for i in range(0, len(data), chunk_size))
+        return self.set_blob_chunks(key, chunks, ttl, chunk_size, content_type)
+    
+    def set_blob_chunks(self, key: str, chunks: Iterable[bytes], ttl: int = 3600,
+                        chunk_size: int = BLOB_CHUNK_SIZE, content_type: Optional[str] = None) -> bool:
+        """
+        Guarda un blob a partir de un iterable de trozos de cualquier tamaño.
+        Los trozos se escriben en lotes y el manifiesto al final, así un lector
+        nunca ve un blob a medias.
+        """
+        writer = self.open_blob_writer(key, ttl, chunk_size, content_type)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+            return writer.commit()
+        except Exception as e:
+            print(f"Cache set blob error: {e}")
+            writer.abort()
+            return False
+    
+    def open_blob_writer(self, key: str, ttl: int = 3600, chunk_size: int = BLOB_CHUNK_SIZE,
+                         content_type: Optional[str] = None) -> "RedisBlobWriter":
+        """Escritura incremental de un blob (para llenar la cache mientras se hace streaming)"""
+        return RedisBlobWriter(self, key, ttl, chunk_size, content_type)
+    
+    def get_blob_manifest(self, key: str) -> Optional[Dict]:
+        """Manifiesto de un blob (size, chunk_size, chunks, content_type, sha256) o None"""
+        return self.get_json(self._blob_manifest_key(key))
+    
+    def blob_complete(self, key: str, manifest: Dict) -> bool:
+        """Verifica en un round trip que ningún trozo fue expulsado de Redis"""
+        if manifest['chunks'] == 0:
+            return True
+        try:
+            chunk_keys = [self._blob_chunk_key(key, i) for i in range(manifest['chunks'])]
+            return self.client.exists(*chunk_keys) == manifest['chunks']
+        except Exception as e:
+            print(f"Cache blob check error: {e}")
+            return False
+    
+    def iter_blob(self, key: str, start: int = 0, end: Optional[int] = None,
+                  manifest: Optional[Dict] = None) -> Iterator[bytes]:
+        """
+        Itera los bytes [start, end] (inclusivo) de un blob sin cargarlo completo.
+        Solo se leen los trozos que cubren el rango, en lotes con MGET.
+        """
+        manifest = manifest or self.get_blob_manifest(key)
+        if not manifest or manifest['size'] == 0:
+            return
+        chunk_size = manifest['chunk_size']
+        end = manifest['size'] - 1 if end is None else min(end, manifest['size'] - 1)
+        if start > end:
+            return
+        
+        first, last = start // chunk_size, end // chunk_size
+        for batch_start in range(first, last + 1, BLOB_BATCH_CHUNKS):
+            indexes = range(batch_start, min(batch_start + BLOB_BATCH_CHUNKS, last + 1))
+            chunk_keys = [self._blob_chunk_key(key, i) for i in indexes]
+            found = self.get_many(chunk_keys)
+            for i, chunk_key in zip(indexes, chunk_keys):
+                chunk = found.get(chunk_key)
+                if chunk is None:
+                    raise Exception(f"Blob chunk missing: {chunk_key}")
+                lo = start - i * chunk_size if i == first else 0
+                hi = end - i * chunk_size + 1 if i == last else len(chunk)
+                yield chunk[lo:hi]
+    
+    def get_blob_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Optional[bytes]:
+        """Lee el rango [start, end] de un blob (o completo) como bytes"""
+        try:
+            manifest = self.get_blob_manifest(key)
+            if not manifest:
+                return None
+            return b"".join(self.iter_blob(key, start, end, manifest))
+        except Exception as e:
+            print(f"Cache get blob error: {e}")
+            return None
+    
+    def delete_blob(self, key: str) -> bool:
+        """Borra el manifiesto y todos los trozos de un blob"""
+        manifest = self.get_blob_manifest(key)
+        keys = [self._blob_manifest_key(key)]
+        if manifest:
+            keys += [self._blob_chunk_key(key, i) for i in range(manifest['chunks'])]
+        return self.delete_many(keys)
+
+
+class RedisBlobWriter:
+    """
+    Escribe un blob en Redis a medida que llegan los bytes. Guarda en memoria
+    como máximo un lote de trozos; `commit()` escribe el manifiesto y `abort()`
+    borra los trozos ya escritos.
+    """
+    
+    def __init__(self, cache: RedisCache, key: str, ttl: int, chunk_size: int,
+                 content_type: Optional[str]):
+        self.cache = cache
+        self.key = key
+        self.ttl = ttl
+        self.chunk_size = chunk_size
+        self.content_type = content_type
+        self.size = 0
+        self.count = 0
+        self._hash = hashlib.sha256()
+        self._buffer = bytearray()
+        self._batch: Dict[str, bytes] = {}
+        self.closed = False
+    
+    def write(self, data: bytes):
+        self._buffer += data
+        self._hash.update(data)
+        self.size += len(data)
+        while len(self._buffer) >= self.chunk_size:
+            self._add_chunk(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+    
+    def _add_chunk(self, chunk: bytes):
+        self._batch[self.cache._blob_chunk_key(self.key, self.count)] = chunk
+        self.count += 1
+        if len(self._batch) >= BLOB_BATCH_CHUNKS:
+            self._flush()
+    
+    def _flush(self):
+        if self._batch and not self.cache.set_many(self._batch, self.ttl):
+            raise Exception("chunk batch write failed")
+        self._batch = {}
+    
+    def commit(self) -> bool:
+        if self._buffer:
+            self._add_chunk(bytes(self._buffer))
+            self._buffer = bytearray()
+        self._flush()
+        manifest = {
+            'size': self.size,
+            'chunk_size': self.chunk_size,
+            'chunks': self.count,
+            'content_type': self.content_type,
+            'sha256': self._hash.hexdigest()
+        }
+        self.closed = True
+        return self.cache.set(
+            self.cache._blob_manifest_key(self.key),
+            json.dumps(manifest).encode('utf-8'),
+            self.ttl
+        )
+    
+    def abort(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._buffer = bytearray()
+        self._batch = {}
+        self.cache.delete_many([self.cache._blob_chunk_key(self.key, i) for i in range(self.count)])
@@ -0,0 +1,107 @@
+import os
+import asyncio
+import hashlib
+import httpx
+from pathlib import Path
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional
+from cache.blob_store import BlobStore
+from streaming.upstream import upstream_etag
+
+# Junto al blob store de PDFs, no dentro: cada BlobStore es dueño de su carpeta
+DEFAULT_PREFIX_DIR = Path(__file__).resolve().parents[1] / "video_prefix"
+
+
+def upstream_span(upstream: httpx.Response):
+    """(inicio, tamaño total) del cuerpo de una respuesta 200/206, o (None, None)"""
+    if upstream.status_code == 200:
+        length = upstream.headers.get('content-length')
+        return 0, int(length) if length and length.isdigit() else None
+    content_range = upstream.headers.get('content-range', '')
+    try:
+        span, total = content_range.split(' ', 1)[1].split('/')
+        return int(span.split('-')[0]), int(total) if total != '*' else None
+    except (IndexError, ValueError):
+        return None, None
+
+
+class VideoPrefixCache:
+    """
+    Cache en disco de los primeros N MB de los videos populares.
+
+    El arranque de la reproducción (el primer tramo) se sirve localmente y el
+    resto se pide al origen con Range. Usa su propio BlobStore, con presupuesto
+    de bytes y expulsión LRU independiente de los PDFs.
+    """
+
+    def __init__(self, store: Optional[BlobStore] = None, prefix_bytes: Optional[int] = None,
+                 min_plays: Optional[int] = None, max_tracked: int = 10000):
+        self.store = store or BlobStore(
+            root=os.getenv('VIDEO_PREFIX_DIR', DEFAULT_PREFIX_DIR),
+            max_bytes=int(os.getenv('VIDEO_PREFIX_MAX_BYTES', 1024 ** 3))
+        )
+        self.prefix_bytes = prefix_bytes or int(float(os.getenv('VIDEO_PREFIX_MB', 4)) * 1024 * 1024)
+        # Reproducciones necesarias para considerar un video popular
+        self.min_plays = min_plays or int(os.getenv('VIDEO_PREFIX_MIN_PLAYS', 2))
+        self.max_tracked = max_tracked
+        self._plays: "OrderedDict[str, int]" = OrderedDict()
+
+    @staticmethod
+    def ref(video_url: str) -> str:
+        return f"video:{hashlib.md5(video_url.encode()).hexdigest()}"
+
+    def lookup(self, video_url: str) -> Optional[Dict]:
+        """{'path', 'prefix_len', 'total_size', 'content_type', 'etag'} del prefijo cacheado, o None"""
+        entry = self.store.resolve(self.ref(video_url))
+        if not entry or not entry['meta']:
+            return None
+        return {
+            'path': entry['path'],
+            'prefix_len': entry['size'],
+            'total_size': entry['meta']['total_size'],
+            'content_type': entry['meta'].get('content_type') or 'video/mp4',
+            'etag': entry['meta'].get('etag')
+        }
+
+    def invalidate(self, video_url: str):
+        self.store.unlink(self.ref(video_url))
+
+    def record_play(self, video_url: str) -> bool:
+        """Cuenta una reproducción desde el inicio; True si el video ya es popular"""
+        plays = self._plays.pop(video_url, 0) + 1
+        self._plays[video_url] = plays
+        while len(self._plays) > self.max_tracked:
+            self._plays.popitem(last=False)
+        return plays >= self.min_plays
+
+    async def capture(self, video_url: str, upstream: httpx.Response,
+                      chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """
+        Deja pasar el stream y guarda sus primeros `prefix_bytes` bytes.
+        Solo aplica a respuestas que empiezan en el byte 0 con tamaño total conocido
+        y de un upstream que acepta rangos (el resto se le pide con Range).
+        """
+        start, total = upstream_span(upstream)
+        ranged = upstream.status_code == 206 or upstream.headers.get('accept-ranges', '').lower() == 'bytes'
+        target = min(self.prefix_bytes, total) if start == 0 and total and ranged else 0
+        content_type = upstream.headers.get('content-type', 'video/mp4')
+        writer = await asyncio.to_thread(self.store.open_writer, content_type) if target else None
+        try:
+            async for chunk in chunks:
+                if writer is not None:
+                    await asyncio.to_thread(writer.write, chunk[:target - writer.size])
+                    if writer.size >= target:
+                        sha = await asyncio.to_thread(writer.commit)
+                        await asyncio.to_thread(
+                            self.store.link, self.ref(video_url), sha,
+                            {'url': video_url, 'total_size': total, 'content_type': content_type,
+                             'etag': upstream_etag(upstream)}
+                        )
+                        writer = None
+                        print(f"🎬 Prefijo de video cacheado: {video_url} ({target} bytes)")
+                yield chunk
+        finally:
+            # Descarga incompleta: no se guarda un prefijo truncado
+            if writer is not None:
+                writer.abort()
+            await chunks.aclose()
@@ -61,6 +61,25 @@ class GenerateStudyGuideRequest(BaseModel):
         }
 
 
+class GroundedStudyGuideRequest(BaseModel):
+    """Modelo para generar guía de estudio a partir de un PDF subido"""
+    topic: str = Field(..., min_length=1, description='Tema de la guía de estudio')
+    class_name: str = Field(..., description='Nivel educativo o nombre de la clase')
+    language: str = Field(default='es')
+    preferences: Optional[Dict] = Field(default_factory=dict)
+    top_k: int = Field(default=6, ge=1, le=12, description='Pasajes del PDF a usar como contexto')
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "topic": "teorema de Pitágoras",
+                "class_name": "Geometría",
+                "language": "es",
+                "top_k": 6
+            }
+        }
+
+
 class GeneratePracticeRequest(BaseModel):
     """Modelo para generar ejercicios de práctica"""
     topic: str = Field(..., min_length=1)
@@ -0,0 +1,160 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from cache.pdf_text_store import PDFTextStore
+from processing.pdf_text import iter_pages_parallel, count_pages
+from processing.worker_pool import run_in_process
+
+INGEST_WORKERS = int(os.getenv('PDF_INGEST_WORKERS', 2))
+INGEST_QUEUE_SIZE = int(os.getenv('PDF_INGEST_QUEUE_SIZE', 1000))
+
+# Un paso recibe el job (dict) y puede actualizar su progreso
+IngestStep = Callable[[Dict], Awaitable[None]]
+
+
+class IngestionQueue:
+    """
+    Cola de ingesta de PDFs subidos: extrae el texto, mide el documento y
+    ejecuta los pasos registrados (índices, metadata...) fuera del request.
+
+    Los jobs se identifican por sha256: el mismo contenido se procesa una vez
+    aunque lo suban muchos usuarios. `INGEST_WORKERS` jobs a la vez; el
+    trabajo pesado de cada uno corre en el pool de procesos.
+    """
+
+    def __init__(self, text_store: PDFTextStore, workers: int = INGEST_WORKERS,
+                 max_jobs: int = 1000):
+        self.text_store = text_store
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.steps: List[Tuple[str, IngestStep]] = [('extract', self._extract)]
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._done: Dict[str, asyncio.Future] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def add_step(self, name: str, step: IngestStep):
+        """Registra un paso que corre después de la extracción de texto"""
+        self.steps.append((name, step))
+
+    def _start(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def enqueue(self, sha: str, path: Path, filename: Optional[str] = None) -> Dict:
+        """
+        Encola la ingesta de un PDF (si no está ya en curso) y devuelve su estado.
+
+        Raises:
+            asyncio.QueueFull: si la cola llegó a `INGEST_QUEUE_SIZE`
+        """
+        job = self._jobs.get(sha)
+        if job and job['status'] in ('queued', 'running'):
+            return self.status(sha)
+
+        self._start()
+        job = {
+            'sha256': sha,
+            'filename': filename,
+            'path': str(path),
+            'status': 'queued',
+            'step': None,
+            'pages_done': 0,
+            'page_count': None,
+            'chars': None,
+            'timings': {},
+            'error': None,
+            'queued_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+        }
+        self._queue.put_nowait(sha)
+        self._jobs[sha] = job
+        self._jobs.move_to_end(sha)
+        self._done[sha] = asyncio.get_running_loop().create_future()
+        # Historial acotado: se olvidan los jobs terminados más viejos
+        while len(self._jobs) > self.max_jobs:
+            oldest, old_job = next(iter(self._jobs.items()))
+            if old_job['status'] in ('queued', 'running'):
+                break
+            self._jobs.pop(oldest)
+        return self.status(sha)
+
+    def status(self, sha: str) -> Optional[Dict]:
+        job = self._jobs.get(sha)
+        if job is None:
+            return None
+        snapshot = {k: v for k, v in job.items() if k != 'path'}
+        if job['status'] == 'queued':
+            snapshot['queue_position'] = list(
+                s for s, j in self._jobs.items() if j['status'] == 'queued'
+            ).index(sha) + 1
+        return snapshot
+
+    def active(self, sha: str) -> bool:
+        job = self._jobs.get(sha)
+        return job is not None and job['status'] in ('queued', 'running')
+
+    async def wait(self, sha: str):
+        """Espera a que termine el job de `sha` (si hay uno en curso)"""
+        future = self._done.get(sha)
+        if future is not None:
+            await asyncio.shield(future)
+
+    async def _worker(self):
+        while True:
+            sha = await self._queue.get()
+            try:
+                await self._run(self._jobs[sha])
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Dict):
+        job['status'] = 'running'
+        job['started_at'] = time.time()
+        try:
+            for name, step in self.steps:
+                job['step'] = name
+                started = time.perf_counter()
+                await step(job)
+                job['timings'][name] = round(time.perf_counter() - started, 3)
+            job['status'] = 'done'
+            print(f"📥 PDF {job['sha256'][:12]} ingerido: {job['page_count']} páginas "
+                  f"({', '.join(f'{k} {v}s' for k, v in job['timings'].items())})")
+        except Exception as e:
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            print(f"❌ Error en ingesta de {job['sha256'][:12]} ({job['step']}): {e}")
+        finally:
+            job['step'] = None
+            job['finished_at'] = time.time()
+            future = self._done.pop(job['sha256'], None)
+            if future is not None and not future.done():
+                future.set_result(job['status'])
+
+    async def _extract(self, job: Dict):
+        """Texto por página (o el ya guardado para este sha) y tamaño del documento"""
+        sha, path = job['sha256'], Path(job['path'])
+        pages = await run_in_threadpool(self.text_store.get_pages, sha)
+        if pages is None:
+            job['page_count'] = await run_in_process(count_pages, str(path))
+            started = time.perf_counter()
+            pages = []
+            async for _, text in iter_pages_parallel(path, list(range(job['page_count']))):
+                pages.append(text)
+                job['pages_done'] = len(pages)
+            await run_in_threadpool(self.text_store.put_pages, sha, pages, time.perf_counter() - started)
+        job['page_count'] = job['pages_done'] = len(pages)
+        job['chars'] = sum(len(text) for text in pages)
+
+    async def aclose(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,76 @@
+import os
+from typing import Dict, List
+from PyPDF2 import PdfReader
+
+# Profundidad máxima del índice (outline) que se guarda
+MAX_OUTLINE_DEPTH = 4
+
+
+def _flatten_outline(reader: PdfReader, items: List, level: int = 1) -> List[Dict]:
+    entries = []
+    for item in items:
+        if isinstance(item, list):
+            if level < MAX_OUTLINE_DEPTH:
+                entries.extend(_flatten_outline(reader, item, level + 1))
+            continue
+        try:
+            page = reader.get_destination_page_number(item) + 1
+        except Exception:
+            page = None
+        entries.append({'title': str(item.title), 'page': page, 'level': level})
+    return entries
+
+
+def _decrypt(reader: PdfReader) -> bool:
+    """True si el PDF se puede leer: sin cifrar, o cifrado con contraseña de usuario vacía"""
+    if not reader.is_encrypted:
+        return True
+    try:
+        return bool(reader.decrypt(''))
+    except Exception as e:
+        print(f"⚠️ No se pudo descifrar el PDF: {e}")
+        return False
+
+
+def read_pdf_metadata(path: str) -> Dict:
+    """
+    Estructura del PDF sin extraer texto: páginas, tamaño de cada una, índice,
+    datos del documento y si está linearizado. Corre en el pool de procesos.
+
+    Si el PDF está cifrado con contraseña, se devuelve solo lo que se lee sin
+    descifrar (versión, tamaño, linearizado) y el resto queda vacío.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(1024)
+    reader = PdfReader(path)
+    metadata = {
+        'page_count': None,
+        'page_sizes': [],
+        'outline': [],
+        'info': {},
+        'pdf_version': reader.pdf_header.replace('%PDF-', ''),
+        'encrypted': reader.is_encrypted,
+        # Linearizado ("fast web view"): la primera página se puede mostrar sin bajar todo
+        'linearized': b'/Linearized' in head,
+        'file_size': os.path.getsize(path),
+    }
+    if not _decrypt(reader):
+        return metadata
+
+    try:
+        metadata['outline'] = _flatten_outline(reader, reader.outline)
+    except Exception as e:
+        print(f"⚠️ No se pudo leer el índice de {path}: {e}")
+
+    if reader.metadata:
+        for key in ('title', 'author', 'subject', 'creator', 'producer'):
+            value = getattr(reader.metadata, key, None)
+            if value:
+                metadata['info'][key] = str(value)
+
+    metadata['page_count'] = len(reader.pages)
+    metadata['page_sizes'] = [
+        [round(float(page.mediabox.width), 1), round(float(page.mediabox.height), 1)]
+        for page in reader.pages
+    ]
+    return metadata
@@ -0,0 +1,96 @@
+import io
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from PyPDF2 import PdfReader, PdfWriter
+from cache.blob_store import BlobStore
+from processing.worker_pool import run_in_process
+from utils.page_ranges import parse_pages, format_pages
+
+# Los recortes se regeneran sin costo si se expulsan: una semana en el blob store
+PAGE_SLICE_TTL = 7 * 86400
+
+
+def slice_pdf(src_path: str, spec: str) -> Tuple[bytes, str]:
+    """
+    Arma un PDF nuevo solo con las páginas pedidas (corre en el pool de procesos).
+
+    Returns:
+        (bytes del PDF, rango canónico, p. ej. "3-7")
+
+    Raises:
+        PageRangeError: si el rango no es válido para el documento
+    """
+    reader = PdfReader(src_path)
+    pages = parse_pages(spec, len(reader.pages))
+    writer = PdfWriter()
+    for index in pages:
+        writer.add_page(reader.pages[index])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue(), format_pages(pages)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PDFPageSlicer:
+    """
+    Recortes de PDFs por rango de páginas, cacheados en el blob store por
+    (sha256 del PDF fuente, rango). El trabajo de PyPDF2 corre en procesos.
+    """
+
+    def __init__(self, blob_store: BlobStore):
+        self.blob_store = blob_store
+        # Un solo recorte en curso por (fuente, rango) aunque lleguen varios requests
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def ref(source_sha: str, spec: str) -> str:
+        return f"pages:{source_sha}:{spec.replace(' ', '')}"
+
+    async def slice(self, source_path: Path, spec: str, source_sha: Optional[str] = None) -> Dict:
+        """
+        Devuelve {'sha', 'size', 'path', 'meta': {'source', 'pages'}} del recorte.
+
+        Raises:
+            PageRangeError: si el rango no es válido para el documento
+        """
+        if source_sha is None:
+            source_sha = await run_in_threadpool(file_sha256, source_path)
+
+        ref = self.ref(source_sha, spec)
+        entry = await run_in_threadpool(self.blob_store.resolve, ref)
+        if entry:
+            return entry
+
+        task = self._inflight.get(ref)
+        if task is None:
+            task = asyncio.create_task(self._build(source_path, source_sha, spec, ref))
+            self._inflight[ref] = task
+            task.add_done_callback(lambda _: self._inflight.pop(ref, None))
+        return await asyncio.shield(task)
+
+    async def _build(self, source_path: Path, source_sha: str, spec: str, ref: str) -> Dict:
+        data, canonical = await run_in_process(slice_pdf, str(source_path), spec)
+
+        def store() -> Dict:
+            sha = self.blob_store.put_bytes(data, content_type='application/pdf')
+            meta = {'source': source_sha, 'pages': canonical}
+            # "3-7" y "3,4,5,6,7" terminan en el mismo recorte
+            for name in {ref, self.ref(source_sha, canonical)}:
+                self.blob_store.link(name, sha, meta=meta, ttl=PAGE_SLICE_TTL)
+            return self.blob_store.resolve(ref)
+
+        entry = await run_in_threadpool(store)
+        if entry is None:
+            raise RuntimeError(f"El recorte de {source_sha[:12]} no quedó en el blob store")
+        print(f"✂️ Recorte de PDF {source_sha[:12]} páginas {canonical}: {len(data)} bytes")
+        return entry
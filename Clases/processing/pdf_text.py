@@ -0,0 +1,203 @@
+import os
+import math
+import time
+import asyncio
+import threading
+import pdfplumber
+from pathlib import Path
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from PyPDF2 import PdfReader
+from processing.worker_pool import PDF_WORKERS, run_in_process
+
+# Páginas mínimas por tarea: con menos, el costo de abrir el PDF en cada proceso domina
+MIN_PAGES_PER_TASK = int(os.getenv('PDF_MIN_PAGES_PER_TASK', 8))
+
+
+# ==================== BACKENDS ====================
+
+class PyPDFBackend:
+    """Solo texto, sin análisis de layout: rápido, pero falla con algunas fuentes"""
+    name = 'pypdf'
+
+    def extract(self, path: str, indices: List[int]) -> List[str]:
+        reader = PdfReader(path)
+        return [reader.pages[index].extract_text() or "" for index in indices]
+
+
+class PdfPlumberBackend:
+    """Reconstruye el texto desde la posición de cada carácter: lento pero robusto"""
+    name = 'pdfplumber'
+
+    def extract(self, path: str, indices: List[int]) -> List[str]:
+        with pdfplumber.open(path, pages=[index + 1 for index in indices]) as pdf:
+            texts = {page.page_number - 1: page.extract_text() or "" for page in pdf.pages}
+        return [texts[index] for index in indices]
+
+
+# Del más rápido al más robusto; cada nivel solo recibe las páginas que el anterior no resolvió
+EXTRACTOR_TIERS = (PyPDFBackend(), PdfPlumberBackend())
+
+
+def looks_garbled(text: str) -> bool:
+    """True si el texto está vacío o parece basura (glifos sin mapear, sin espacios, etc.)"""
+    stripped = text.strip()
+    if not stripped:
+        return True
+    if '(cid:' in stripped or stripped.count('\ufffd') > len(stripped) * 0.02:
+        return True
+    visible = [ch for ch in stripped if not ch.isspace()]
+    if sum(not ch.isprintable() for ch in visible) > len(visible) * 0.05:
+        return True
+    if sum(ch.isalnum() for ch in visible) < len(visible) * 0.5:
+        return True
+    # Palabras pegadas: típico de fuentes sin espacios explícitos
+    return len(stripped) > 200 and stripped.count(' ') + stripped.count('\n') < len(stripped) / 50
+
+
+def extract_page_list(path: str, indices: List[int]) -> Tuple[List[str], Dict[str, Dict]]:
+    """
+    Texto de las páginas `indices` (desde 0), en ese orden, probando los
+    backends por niveles. Corre en el pool de procesos.
+
+    Returns:
+        (texto por página, {backend: {'pages', 'seconds', 'errors'}})
+    """
+    texts: Dict[int, str] = {}
+    timings: Dict[str, Dict] = {}
+    pending = list(indices)
+    for tier, backend in enumerate(EXTRACTOR_TIERS):
+        if not pending:
+            break
+        last = tier == len(EXTRACTOR_TIERS) - 1
+        started = time.perf_counter()
+        errors = 0
+        try:
+            results = backend.extract(path, pending)
+        except Exception as e:
+            if last:
+                raise
+            print(f"⚠️ Extractor {backend.name} falló, se usa el siguiente: {e}")
+            results = [""] * len(pending)
+            errors = 1
+        timings[backend.name] = {
+            'pages': len(pending),
+            'seconds': time.perf_counter() - started,
+            'errors': errors
+        }
+
+        unresolved = []
+        for index, text in zip(pending, results):
+            if last or not looks_garbled(text):
+                # Si el último nivel tampoco saca nada, se conserva lo del anterior
+                texts[index] = text if text.strip() else texts.get(index, text)
+            else:
+                texts[index] = text
+                unresolved.append(index)
+        pending = unresolved
+    return [texts[index] for index in indices], timings
+
+
+class ExtractorStats:
+    """Páginas, tiempo y errores acumulados por backend de extracción"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backends: Dict[str, Dict] = {}
+
+    def record(self, timings: Dict[str, Dict]):
+        with self._lock:
+            for name, timing in timings.items():
+                backend = self._backends.setdefault(name, {'calls': 0, 'pages': 0, 'seconds': 0.0, 'errors': 0})
+                backend['calls'] += 1
+                backend['pages'] += timing['pages']
+                backend['seconds'] += timing['seconds']
+                backend['errors'] += timing['errors']
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                name: {
+                    **backend,
+                    'seconds': round(backend['seconds'], 3),
+                    'ms_per_page': round(backend['seconds'] * 1000 / backend['pages'], 2) if backend['pages'] else 0.0
+                }
+                for name, backend in self._backends.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._backends.clear()
+
+
+extractor_stats = ExtractorStats()
+
+
+# ==================== EXTRACCIÓN ====================
+
+def extract_pages(path: Path) -> Tuple[List[str], float]:
+    """
+    Extrae el texto de todas las páginas en este proceso (secuencial, un solo núcleo).
+
+    Returns:
+        (texto por página, segundos que tomó)
+    """
+    started = time.perf_counter()
+    pages, timings = extract_page_list(str(path), list(range(count_pages(path))))
+    extractor_stats.record(timings)
+    return pages, time.perf_counter() - started
+
+
+def count_pages(path: Path) -> int:
+    """Número de páginas leyendo solo la estructura del PDF (sin layout)"""
+    return len(PdfReader(str(path)).pages)
+
+
+def split_pages(indices: List[int], workers: int = PDF_WORKERS,
+                max_pages: Optional[int] = None) -> List[List[int]]:
+    """
+    Divide las páginas en grupos contiguos: ~2 por proceso para repartir la carga,
+    o de a `max_pages` cuando importa recibir las primeras páginas pronto.
+    """
+    size = max(MIN_PAGES_PER_TASK, math.ceil(len(indices) / max(workers * 2, 1)))
+    if max_pages:
+        size = min(size, max_pages)
+    return [indices[start:start + size] for start in range(0, len(indices), size)]
+
+
+async def iter_pages_parallel(path: Path, indices: List[int],
+                              max_pages_per_task: Optional[int] = None) -> AsyncIterator[Tuple[int, str]]:
+    """
+    Extrae las páginas `indices` repartidas entre los procesos del pool y las
+    entrega en orden, cada grupo apenas termina (sin esperar al documento completo).
+    """
+    groups = split_pages(indices, max_pages=max_pages_per_task)
+    tasks = [
+        asyncio.ensure_future(run_in_process(extract_page_list, str(path), group))
+        for group in groups
+    ]
+    try:
+        for group, task in zip(groups, tasks):
+            texts, timings = await task
+            extractor_stats.record(timings)
+            for index, text in zip(group, texts):
+                yield index, text
+    finally:
+        # Cliente desconectado: los grupos que no empezaron no se procesan y se
+        # espera a los cancelados para no dejar futures sueltos ni excepciones sin leer
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def extract_pages_parallel(path: Path) -> Tuple[List[str], float]:
+    """
+    Extrae el texto repartiendo rangos de páginas entre los procesos del pool
+    y los vuelve a unir en orden.
+
+    Returns:
+        (texto por página, segundos que tomó)
+    """
+    started = time.perf_counter()
+    page_count = await run_in_process(count_pages, str(path))
+    pages = [text async for _, text in iter_pages_parallel(path, list(range(page_count)))]
+    return pages, time.perf_counter() - started
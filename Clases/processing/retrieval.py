@@ -0,0 +1,110 @@
+import os
+import re
+import math
+import unicodedata
+from collections import Counter
+from typing import Dict, List
+
+# Tamaño de cada pasaje y solapamiento entre pasajes vecinos (en caracteres)
+CHUNK_CHARS = int(os.getenv('RAG_CHUNK_CHARS', 1200))
+CHUNK_OVERLAP = int(os.getenv('RAG_CHUNK_OVERLAP', 200))
+# Tope de contexto que se manda al modelo (~4 caracteres por token)
+CONTEXT_CHARS = int(os.getenv('RAG_CONTEXT_CHARS', 6000))
+
+# Palabras vacías (es/en) que no aportan a la relevancia
+STOPWORDS = frozenset("""
+a al algo como con de del el ella ellos en entre es esta este esto la las le lo los mas me mi no o
+para pero por que se si sin sobre su sus te tu un una uno y ya
+an and are as at be by for from has in is it its of on or that the this to was were with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Palabras en minúsculas y sin acentos, sin palabras vacías"""
+    normalized = unicodedata.normalize('NFKD', text.lower())
+    normalized = ''.join(ch for ch in normalized if not unicodedata.combining(ch))
+    return [word for word in re.findall(r'\w+', normalized) if word not in STOPWORDS and len(word) > 1]
+
+
+def chunk_pages(pages: List[str], chunk_chars: int = CHUNK_CHARS,
+                overlap: int = CHUNK_OVERLAP) -> List[Dict]:
+    """
+    Parte el texto de cada página en pasajes de ~`chunk_chars` caracteres,
+    cortando en límites de palabra y con `overlap` caracteres repetidos
+    para no partir una idea a la mitad.
+
+    Returns:
+        [{'page' (desde 1), 'text'}]
+    """
+    chunks = []
+    for number, text in enumerate(pages, start=1):
+        text = re.sub(r'\s+', ' ', text).strip()
+        start = 0
+        while start < len(text):
+            end = min(start + chunk_chars, len(text))
+            if end < len(text):
+                space = text.rfind(' ', start + chunk_chars // 2, end)
+                end = space if space != -1 else end
+            chunks.append({'page': number, 'text': text[start:end].strip()})
+            if end >= len(text):
+                break
+            next_start = text.find(' ', max(end - overlap, start + 1))
+            start = next_start + 1 if next_start != -1 and next_start < end else end
+    return [chunk for chunk in chunks if chunk['text']]
+
+
+class BM25Index:
+    """Índice BM25 en memoria sobre los pasajes de un documento"""
+
+    def __init__(self, chunks: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self._terms = [Counter(tokenize(chunk['text'])) for chunk in chunks]
+        self._lengths = [sum(terms.values()) for terms in self._terms]
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        document_freq = Counter(term for terms in self._terms for term in terms)
+        total = len(chunks)
+        self._idf = {
+            term: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for term, freq in document_freq.items()
+        }
+
+    def score(self, query_terms: List[str], position: int) -> float:
+        terms = self._terms[position]
+        norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / (self._avg_length or 1))
+        score = 0.0
+        for term in query_terms:
+            freq = terms.get(term)
+            if freq:
+                score += self._idf[term] * freq * (self.k1 + 1) / (freq + norm)
+        return score
+
+    def top_k(self, query: str, k: int = 6, max_chars: int = CONTEXT_CHARS) -> List[Dict]:
+        """
+        Los `k` pasajes más relevantes para `query`, sin pasar de `max_chars`
+        en total (el contexto que se manda al modelo queda acotado).
+
+        Returns:
+            [{'page', 'text', 'score'}] en orden del documento
+        """
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not query_terms:
+            return []
+        ranked = sorted(
+            ((self.score(query_terms, i), i) for i in range(len(self.chunks))),
+            reverse=True
+        )
+        selected, used = [], 0
+        for score, position in ranked:
+            if score <= 0 or len(selected) >= k:
+                break
+            text = self.chunks[position]['text']
+            if used + len(text) > max_chars:
+                continue
+            selected.append((position, score))
+            used += len(text)
+        return [
+            {**self.chunks[position], 'score': round(score, 4)}
+            for position, score in sorted(selected)
+        ]
@@ -0,0 +1,33 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+# Procesos para trabajo CPU (PDFs); por defecto uno por núcleo
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', os.cpu_count() or 2))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Pool de procesos compartido, creado al primer uso"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _pool
+
+
+async def run_in_process(fn: Callable[..., Any], *args) -> Any:
+    """
+    Ejecuta `fn(*args)` en el pool de procesos sin bloquear el event loop.
+    `fn` y sus argumentos deben ser serializables (funciones de nivel de módulo).
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), fn, *args)
+
+
+def shutdown_process_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,105 @@
+import os
+import secrets
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from cache.redis_cache import RedisCache
+from cache.cache_stats import cache_stats
+from cache.blob_store import BlobStore
+from streaming.upstream import upstream_pool
+from routes.text_routes import pdf_prefetcher
+from routes.video_routes import video_prefix_cache
+from processing.pdf_text import extractor_stats
+
+# Sin ADMIN_TOKEN configurado las rutas de admin quedan apagadas (404)
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None),
+                  authorization: Optional[str] = Header(None)):
+    """Exige el token de admin en `X-Admin-Token` o `Authorization: Bearer ...`"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    token = x_admin_token
+    if token is None and authorization and authorization.lower().startswith('bearer '):
+        token = authorization[7:].strip()
+    if not token or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Admin token required")
+
+
+router = APIRouter(prefix="/api/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+cache = RedisCache()
+blob_store = BlobStore()
+
+CACHE_NAMESPACES = ["text", "videos", "pdf"]
+
+
+@router.get("/cache/stats")
+def get_cache_stats():
+    """
+    Métricas de cache por namespace (text, videos, pdf...).
+
+    Hits, misses, hit rate, latencia, bytes leídos/escritos y evictions
+    desde que arrancó el proceso, más los contadores globales de Redis.
+    """
+    return {
+        'success': True,
+        'since': cache_stats.started_at,
+        'namespaces': cache_stats.snapshot(),
+        'redis': cache.server_stats()
+    }
+
+
+@router.get("/cache/keys")
+def get_cache_key_report(
+    prefix: str = Query(None, description="Namespace a muestrear (todos si se omite)"),
+    sample: int = Query(50, ge=1, le=1000, description="Keys a muestrear por namespace")
+):
+    """
+    Reporte muestreado de tamaños y TTLs de las keys de cada namespace.
+    """
+    prefixes = [prefix] if prefix else CACHE_NAMESPACES
+    return {
+        'success': True,
+        'reports': [cache.sample_keys(p, sample) for p in prefixes]
+    }
+
+
+@router.get("/blobs")
+def get_blob_store_usage():
+    """Uso del blob store en disco (blobs, bytes, bytes fijados, presupuesto)"""
+    return {
+        'success': True,
+        'blob_store': blob_store.usage(),
+        'video_prefix': video_prefix_cache.store.usage() if video_prefix_cache else None
+    }
+
+
+@router.get("/upstreams")
+def get_upstream_metrics():
+    """
+    Conexiones a upstreams de los proxies (videos, PDFs): activas y en cola
+    por host, rechazadas por límite, streams estancados e idle timeouts.
+    """
+    return {'success': True, 'upstreams': upstream_pool.metrics()}
+
+
+@router.get("/prefetch")
+def get_prefetch_metrics():
+    """Precarga de PDFs tras búsquedas: programados, precargados, descartados, bytes"""
+    return {'success': True, 'prefetch': pdf_prefetcher.metrics()}
+
+
+@router.get("/extractors")
+def get_extractor_metrics():
+    """
+    Extracción de texto de PDFs por backend (pypdf rápido, pdfplumber de
+    respaldo): páginas procesadas, segundos y ms por página.
+    """
+    return {'success': True, 'extractors': extractor_stats.snapshot()}
+
+
+@router.post("/cache/stats/reset")
+def reset_cache_stats():
+    """Reinicia los contadores de cache del proceso"""
+    cache_stats.reset()
+    return {'success': True}
@@ -1,40 +1,611 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from collections import OrderedDict
 from pathlib import Path
-import shutil
-import pdfplumber
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import zipfile
+import json
+import os
+import re
+import time
+import uuid
+import threading
+from cache.blob_store import BlobStore
+from cache.pdf_text_store import PDFTextStore
+from streaming.blob_response import blob_response
+from processing.pdf_pages import PDFPageSlicer, file_sha256
+from processing.pdf_text import extract_pages_parallel, iter_pages_parallel, count_pages
+from processing.ingestion import IngestionQueue
+from processing.retrieval import BM25Index, chunk_pages
+from processing.pdf_metadata import read_pdf_metadata
+from models.schemas import GroundedStudyGuideRequest
+# Mismo cliente de IA y mismos contadores de rate limit que las rutas de texto
+from routes.text_routes import ai_generator, rate_limiter
+from utils.rate_limiter import RateLimitException
+from processing.worker_pool import run_in_process
+from utils.conditional import make_etag, etag_matches, not_modified
+from utils.page_ranges import PageRangeError, parse_pages, format_pages
 
 router = APIRouter(prefix="/pdf", tags=["pdf"])
 
+# Subidas anteriores al blob store (se siguen sirviendo desde aquí)
 UPLOAD_DIR = Path(__file__).resolve().parents[1] / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# En modo stream se extrae de a pocas páginas para que la primera llegue rápido
+STREAM_PAGES_PER_TASK = 4
+MAX_UPLOAD_BYTES = int(os.getenv('PDF_UPLOAD_MAX_BYTES', 100 * 1024 * 1024))
+# Subida masiva: PDFs y bytes por lote, y segundos máximos esperando la ingesta con wait=true
+BULK_MAX_FILES = int(os.getenv('PDF_BULK_MAX_FILES', 200))
+BULK_MAX_BYTES = int(os.getenv('PDF_BULK_MAX_BYTES', 1024 * 1024 * 1024))
+BULK_WAIT_SECONDS = float(os.getenv('PDF_BULK_WAIT_SECONDS', 120))
+
+blob_store = BlobStore()
+page_slicer = PDFPageSlicer(blob_store)
+text_store = PDFTextStore()
+ingestion_queue = IngestionQueue(text_store)
+# Índices BM25 de los últimos PDFs consultados (sha -> índice); se usan desde el threadpool
+_passage_indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+_passage_lock = threading.Lock()
+MAX_PASSAGE_INDEXES = 16
+# Una sola extracción en curso por sha aunque lleguen varios requests
+_text_inflight: Dict[str, asyncio.Task] = {}
+_metadata_inflight: Dict[str, asyncio.Task] = {}
+
+def _upload_ref(filename: str) -> str:
+    return f"upload:{filename}"
+
+def _latest_ref(original: str) -> str:
+    # El nombre original apunta a la última subida con ese nombre (como antes de los nombres únicos)
+    return f"upload-latest:{Path(original).name}"
+
+def _lookup_upload(filename: str) -> Tuple[Optional[Path], Optional[str]]:
+    for ref in (_upload_ref(filename), _latest_ref(filename)):
+        entry = blob_store.resolve(ref)
+        if entry:
+            return entry['path'], entry['sha']
+    legacy = UPLOAD_DIR / Path(filename).name
+    if legacy.exists():
+        return legacy, None
+    return None, None
+
+async def _resolve_upload(filename: str) -> Tuple[Path, Optional[str]]:
+    """
+    Ruta en disco y sha256 de un PDF subido (blob store o carpeta legacy, sin hash).
+    Acepta el nombre único de la subida o el nombre original del archivo.
+    """
+    fpath, sha = await run_in_threadpool(_lookup_upload, filename)
+    if fpath is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return fpath, sha
+
+def _upload_name(filename: str) -> str:
+    """Nombre único por subida: dos archivos con el mismo nombre no se pisan"""
+    safe = re.sub(r'[^A-Za-z0-9._-]+', '_', Path(filename).name).strip('._') or 'document.pdf'
+    return f"{uuid.uuid4().hex[:12]}_{safe}"
+
+async def _store_upload(read: Callable[[int], Awaitable[bytes]]) -> Tuple[str, int, bool]:
+    """
+    Copia una subida al blob store en trozos sin bloquear el event loop,
+    calculando el sha256 mientras se escribe. `read(n)` devuelve el siguiente
+    trozo (b"" al final): `UploadFile.read` o un miembro de un zip.
+
+    Returns:
+        (sha256, bytes, True si el contenido ya estaba almacenado)
+    """
+    # Los PDFs de usuarios se fijan: nunca se expulsan por el presupuesto LRU
+    writer = await run_in_threadpool(blob_store.open_writer, "application/pdf", True)
+    try:
+        while chunk := await read(UPLOAD_CHUNK_SIZE):
+            if writer.size == 0 and b"%PDF-" not in chunk[:1024]:
+                raise HTTPException(status_code=400, detail="File is not a PDF")
+            if writer.size + len(chunk) > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail=f"PDF larger than {MAX_UPLOAD_BYTES} bytes")
+            await run_in_threadpool(writer.write, chunk)
+        if writer.size == 0:
+            raise HTTPException(status_code=400, detail="Empty file")
+        # Mismo contenido subido por otro usuario: una sola copia en disco
+        duplicate = await run_in_threadpool(blob_store.info, writer.sha256) is not None
+        sha = await run_in_threadpool(writer.commit)
+        return sha, writer.size, duplicate
+    finally:
+        await run_in_threadpool(writer.abort)
+
+async def _document_text(fpath: Path, sha: Optional[str]) -> Tuple[List[str], bool]:
+    """
+    Texto por página de un PDF: desde el store si ya se extrajo (por sha256),
+    si no se extrae una vez y se guarda.
+
+    Returns:
+        (texto por página, True si venía del store)
+    """
+    if sha is None:
+        sha = await run_in_threadpool(file_sha256, fpath)
+    pages = await run_in_threadpool(text_store.get_pages, sha)
+    if pages is not None:
+        return pages, True
+    if ingestion_queue.active(sha):
+        # La ingesta ya lo está extrayendo: se espera en vez de repetir el trabajo
+        await ingestion_queue.wait(sha)
+        pages = await run_in_threadpool(text_store.get_pages, sha)
+        if pages is not None:
+            return pages, True
+
+    async def extract() -> List[str]:
+        pages, seconds = await extract_pages_parallel(fpath)
+        await run_in_threadpool(text_store.put_pages, sha, pages, seconds)
+        print(f"📄 Texto extraído de {sha[:12]}: {len(pages)} páginas en {seconds:.2f}s")
+        return pages
+
+    task = _text_inflight.get(sha)
+    if task is None:
+        task = asyncio.create_task(extract())
+        _text_inflight[sha] = task
+        task.add_done_callback(lambda _: _text_inflight.pop(sha, None))
+    return await asyncio.shield(task), False
+
+async def _document_metadata(fpath: Path, sha: str) -> Tuple[Dict, bool]:
+    """
+    Metadata del PDF (estructura + caracteres por página), calculada una vez
+    por sha256 y guardada junto al texto. No fuerza la extracción: si el texto
+    todavía no está guardado, `page_chars` y los totales quedan en null y se
+    completan en un request posterior.
+
+    Returns:
+        (metadata, True si venía del store)
+    """
+    stored = await run_in_threadpool(text_store.get_metadata, sha)
+    if stored is not None and stored.get('page_chars') is not None:
+        return stored, True
+
+    async def build() -> Dict:
+        metadata = dict(stored) if stored is not None else await run_in_process(read_pdf_metadata, str(fpath))
+        # Los caracteres por página salen del texto ya extraído, si lo hay
+        page_chars = None
+        if await run_in_threadpool(text_store.document, sha):
+            page_chars = await run_in_threadpool(text_store.page_lengths, sha)
+        metadata.update(
+            sha256=sha,
+            page_chars=page_chars,
+            text_pages=sum(1 for chars in page_chars if chars) if page_chars is not None else None,
+            total_chars=sum(page_chars) if page_chars is not None else None
+        )
+        if stored is None or page_chars is not None:
+            await run_in_threadpool(text_store.put_metadata, sha, metadata)
+        return metadata
+
+    task = _metadata_inflight.get(sha)
+    if task is None:
+        task = asyncio.create_task(build())
+        _metadata_inflight[sha] = task
+        task.add_done_callback(lambda _: _metadata_inflight.pop(sha, None))
+    return await asyncio.shield(task), stored is not None
+
+async def _metadata_step(job: Dict):
+    await _document_metadata(Path(job['path']), job['sha256'])
+
+ingestion_queue.add_step('metadata', _metadata_step)
+
+async def _register_upload(read: Callable[[int], Awaitable[bytes]], original: str) -> Dict:
+    """
+    Guarda una subida y le asigna su nombre propio. El nombre original sigue
+    resolviendo a la subida más reciente con ese nombre.
+    """
+    sha, size, duplicate = await _store_upload(read)
+    name = _upload_name(original)
+    meta = {'filename': original, 'size': size, 'uploaded': time.time()}
+    await run_in_threadpool(blob_store.link, _upload_ref(name), sha, meta)
+    await run_in_threadpool(blob_store.link, _latest_ref(original), sha, {**meta, 'upload': name})
+    return {
+        "filename": name,
+        "original_filename": original,
+        "sha256": sha,
+        "size": size,
+        "deduplicated": duplicate
+    }
+
 @router.post("/upload")
 async def upload_pdf(file: UploadFile = File(...)):
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files allowed")
-    dest = UPLOAD_DIR / file.filename
-    with dest.open("wb") as f:
-        shutil.copyfileobj(file.file, f)
-    return {"ok": True, "filename": file.filename}
+    entry = await _register_upload(file.read, file.filename)
+    return {"ok": True, **entry, "ingestion": await _ingest(entry['sha256'], entry['filename'])}
+
+async def _bulk_sources(files: List[UploadFile], limit: int):
+    """
+    (nombre original, origen, read, error) de cada PDF del lote; los .zip se
+    recorren miembro por miembro sin descomprimirlos a disco ni a memoria
+    completos. Un archivo que no se puede leer sale con `error` y read None.
+    Pasados `limit` archivos se entrega un solo rechazo por el resto y se corta.
+    """
+    count = 0
+
+    def skipped(name: str, source: str):
+        return name, source, None, f"Batch limit of {limit} files reached; this and later files were skipped"
+
+    for file in files:
+        if count >= limit:
+            yield skipped(file.filename, "upload")
+            return
+        lower = (file.filename or '').lower()
+        if lower.endswith(".pdf"):
+            count += 1
+            yield file.filename, "upload", file.read, None
+            continue
+        if not lower.endswith(".zip"):
+            count += 1
+            yield file.filename, "upload", None, "Only PDF or ZIP files allowed"
+            continue
+        try:
+            archive = await run_in_threadpool(zipfile.ZipFile, file.file)
+        except (zipfile.BadZipFile, OSError) as e:
+            count += 1
+            yield file.filename, "upload", None, f"Invalid zip file: {e}"
+            continue
+        source = f"zip:{file.filename}"
+        with archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or not name.lower().endswith(".pdf") or "__MACOSX/" in name:
+                    continue
+                if count >= limit:
+                    yield skipped(Path(name).name, source)
+                    return
+                count += 1
+                try:
+                    member = await run_in_threadpool(archive.open, info)
+                except (NotImplementedError, zipfile.BadZipFile, OSError) as e:
+                    yield Path(name).name, source, None, f"Unreadable zip member: {e}"
+                    continue
+                except RuntimeError as e:
+                    # zipfile usa RuntimeError para miembros cifrados (NotImplementedError va antes: es subclase)
+                    yield Path(name).name, source, None, f"Encrypted zip member: {e}"
+                    continue
+                try:
+                    yield Path(name).name, source, \
+                        (lambda n, member=member: run_in_threadpool(member.read, n)), None
+                finally:
+                    await run_in_threadpool(member.close)
+
+@router.post("/upload/bulk")
+async def upload_pdfs_bulk(
+    files: List[UploadFile] = File(..., description="PDFs y/o archivos .zip con PDFs"),
+    wait: bool = Query(False, description="Esperar a que termine la ingesta (hasta PDF_BULK_WAIT_SECONDS)")
+):
+    """
+    Subida masiva: cada PDF (suelto o dentro de un zip) se guarda por
+    contenido, los repetidos quedan en una sola copia y la extracción corre
+    en paralelo en la cola de ingesta. Responde un manifiesto por archivo.
+
+    Límites por lote: PDF_BULK_MAX_FILES archivos y PDF_BULK_MAX_BYTES bytes
+    guardados; al pasarlos se corta y el resto del lote queda en una sola
+    entrada rechazada.
+    """
+    manifest: List[Dict] = []
+    jobs: Dict[str, Dict] = {}
+    batch_bytes = 0
+
+    def counted(read: Callable[[int], Awaitable[bytes]]) -> Callable[[int], Awaitable[bytes]]:
+        async def read_counted(n: int) -> bytes:
+            nonlocal batch_bytes
+            chunk = await read(n)
+            batch_bytes += len(chunk)
+            if batch_bytes > BULK_MAX_BYTES:
+                raise HTTPException(status_code=413, detail=f"Batch larger than {BULK_MAX_BYTES} bytes")
+            return chunk
+        return read_counted
+
+    sources = _bulk_sources(files, BULK_MAX_FILES)
+    try:
+        async for original, source, read, error in sources:
+            item = {"original_filename": original, "source": source}
+            if error is not None:
+                manifest.append({**item, "status": "rejected", "error": error})
+                continue
+            try:
+                entry = await _register_upload(counted(read), original)
+            except HTTPException as e:
+                if batch_bytes > BULK_MAX_BYTES:
+                    manifest.append({**item, "status": "rejected",
+                                     "error": f"{e.detail}; this and later files were skipped"})
+                    break
+                manifest.append({**item, "status": "rejected", "error": e.detail})
+                continue
+            except Exception as e:
+                print(f"❌ Error guardando {original}: {e}")
+                manifest.append({**item, "status": "rejected", "error": str(e)})
+                continue
+            if entry['sha256'] not in jobs:
+                jobs[entry['sha256']] = await _ingest(entry['sha256'], entry['filename'])
+            manifest.append({**item, **entry, "status": "stored"})
+    finally:
+        await sources.aclose()
+
+    if wait and jobs:
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(ingestion_queue.wait(sha) for sha in jobs)),
+                timeout=BULK_WAIT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            pass
+
+    for item in manifest:
+        sha = item.get('sha256')
+        if sha:
+            job = ingestion_queue.status(sha) or jobs[sha]
+            item["ingestion"] = {k: job.get(k) for k in ('status', 'page_count', 'error') if k in job}
+
+    return {
+        "ok": True,
+        "files": manifest,
+        "summary": {
+            "files": len(manifest),
+            "stored": sum(1 for item in manifest if item['status'] == 'stored'),
+            "rejected": sum(1 for item in manifest if item['status'] == 'rejected'),
+            "deduplicated": sum(1 for item in manifest if item.get('deduplicated')),
+            "unique_documents": len(jobs)
+        }
+    }
+
+async def _ingest(sha: str, filename: str) -> Dict:
+    """Encola la extracción/indexado en segundo plano (salvo que ya esté hecha)"""
+    if await run_in_threadpool(text_store.has, sha):
+        return {"sha256": sha, "status": "done"}
+    try:
+        return ingestion_queue.enqueue(sha, blob_store.path_for(sha), filename)
+    except asyncio.QueueFull:
+        # Cola llena: el texto se extraerá al primer request que lo pida
+        return {"sha256": sha, "status": "deferred"}
+
+@router.get("/search")
+async def search_pdfs(
+    q: str = Query(..., min_length=2, description="Texto a buscar; entre comillas para frase exacta"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Páginas de los PDFs subidos que mencionan `q`, ordenadas por relevancia (BM25).
+    El `snippet` es HTML escapado con `<mark>` en los términos encontrados.
+    """
+    started = time.perf_counter()
+
+    def search() -> List[Dict]:
+        names: Dict[str, List[str]] = {}
+
+        def uploaded(sha: str) -> bool:
+            # Solo PDFs con una subida vigente; limit/offset ya cuentan sin los demás
+            names[sha] = blob_store.refs_for(sha, prefix=_upload_ref(''))
+            return bool(names[sha])
+
+        return [
+            {
+                "filename": names[hit['sha']][0][len(_upload_ref('')):],
+                "sha256": hit['sha'],
+                "page": hit['page'],
+                "snippet": hit['snippet'],
+                "score": hit['score']
+            }
+            for hit in text_store.search(q, limit=limit, offset=offset, keep=uploaded)
+        ]
+
+    hits = await run_in_threadpool(search)
+    return {
+        "ok": True,
+        "query": q,
+        "hits": hits,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+def _passage_index(sha: str, pages: List[str]) -> BM25Index:
+    with _passage_lock:
+        index = _passage_indexes.get(sha)
+        if index is not None:
+            _passage_indexes.move_to_end(sha)
+            return index
+    # El índice se arma fuera del lock: dos requests del mismo PDF a lo sumo lo arman dos veces
+    index = BM25Index(chunk_pages(pages))
+    with _passage_lock:
+        index = _passage_indexes.setdefault(sha, index)
+        _passage_indexes.move_to_end(sha)
+        while len(_passage_indexes) > MAX_PASSAGE_INDEXES:
+            _passage_indexes.popitem(last=False)
+    return index
+
+@router.post("/study-guide/{filename}", tags=["AI Generation"])
+async def generate_grounded_study_guide(filename: str, request: Request, body: GroundedStudyGuideRequest):
+    """
+    Guía de estudio basada en un PDF subido: se eligen con BM25 los pasajes
+    más relevantes para el tema y solo esos van al modelo, así el prompt no
+    crece con el tamaño del documento.
+    """
+    try:
+        rate_limiter.check_rate_limit(
+            client_id=request.client.host,
+            endpoint='grounded_generation',
+            max_calls=20,
+            time_window=3600
+        )
+    except RateLimitException as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    fpath, sha = await _resolve_upload(filename)
+    if sha is None:
+        sha = await run_in_threadpool(file_sha256, fpath)
+    try:
+        pages, _ = await _document_text(fpath, sha)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to extract text: {e}")
+
+    index = await run_in_threadpool(_passage_index, sha, pages)
+    passages = await run_in_threadpool(index.top_k, body.topic, body.top_k)
+    if not passages:
+        raise HTTPException(status_code=422, detail="El PDF no tiene pasajes relacionados con el tema")
+
+    print(f"\n📚 Generando guía desde {filename}: {len(passages)} pasajes "
+          f"({sum(len(p['text']) for p in passages)} caracteres)")
+    content = await run_in_threadpool(
+        ai_generator.generate_grounded_study_guide,
+        body.topic, body.class_name, body.language, passages, body.preferences
+    )
+    return {
+        'success': True,
+        'content': content,
+        'format': 'markdown',
+        'topic': body.topic,
+        'class_name': body.class_name,
+        'sources': [{'page': p['page'], 'score': p['score']} for p in passages],
+        'context_chars': sum(len(p['text']) for p in passages)
+    }
+
+@router.get("/metadata/{filename}")
+async def pdf_metadata(filename: str):
+    """
+    Páginas, tamaño de cada página, índice (outline), caracteres de texto por
+    página y si está linearizado; precalculado en la ingesta, sin reabrir el PDF.
+    `page_chars` es null mientras el texto no se haya extraído.
+    """
+    fpath, sha = await _resolve_upload(filename)
+    if sha is None:
+        sha = await run_in_threadpool(file_sha256, fpath)
+    try:
+        metadata, cached = await _document_metadata(fpath, sha)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to read PDF metadata: {e}")
+    return {"ok": True, "filename": filename, "cached": cached, **metadata}
+
+@router.get("/status/{filename}")
+async def ingestion_status(filename: str):
+    """Estado de la ingesta de un PDF subido: queued, running (con progreso), done o failed"""
+    fpath, sha = await _resolve_upload(filename)
+    if sha is None:
+        sha = await run_in_threadpool(file_sha256, fpath)
+    job = ingestion_queue.status(sha)
+    if job is None:
+        document = await run_in_threadpool(text_store.document, sha)
+        job = {"sha256": sha, "status": "done" if document else "not_ingested"}
+        if document:
+            job.update(page_count=document['page_count'], chars=document['chars'])
+    return {"ok": True, **job, "filename": filename}
 
 @router.get("/serve/{filename}")
-def serve_pdf(filename: str):
-    fpath = UPLOAD_DIR / filename
-    if not fpath.exists():
-        raise HTTPException(status_code=404, detail="File not found")
-    return FileResponse(fpath, media_type="application/pdf", filename=filename)
+async def serve_pdf(filename: str, request: Request):
+    fpath, sha = await _resolve_upload(filename)
+    if sha is None:
+        # Subida legacy (carpeta uploads): el hash se calcula para poder responder 304
+        sha = await run_in_threadpool(file_sha256, fpath)
+    etag = make_etag(sha)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return not_modified(etag)
+    return blob_response(fpath, "application/pdf", headers={'ETag': etag}, filename=filename)
 
-@router.get("/text/{filename}")
-def extract_text(filename: str):
-    fpath = UPLOAD_DIR / filename
-    if not fpath.exists():
-        raise HTTPException(status_code=404, detail="File not found")
-    pages = []
+@router.get("/pages/{filename}")
+async def serve_pdf_pages(filename: str, request: Request,
+                          pages: str = Query(..., description="Páginas a incluir, p. ej. 3-7 o 1,4,9-12")):
+    """PDF nuevo y más liviano con solo las páginas pedidas (cacheado por contenido y rango)"""
+    fpath, sha = await _resolve_upload(filename)
     try:
-        with pdfplumber.open(fpath) as pdf:
-            for p in pdf.pages:
-                pages.append(p.extract_text() or "")
+        entry = await page_slicer.slice(fpath, pages, source_sha=sha)
+    except PageRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Failed to split PDF: {e}")
+
+    etag = make_etag(entry['sha'])
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return not_modified(etag)
+    return blob_response(
+        entry['path'], "application/pdf",
+        headers={'ETag': etag},
+        filename=f"{Path(filename).stem}_p{entry['meta']['pages']}.pdf",
+        range_header=request.headers.get('range')
+    )
+
+def _ndjson(payload: Dict) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+async def _requested_pages(fpath: Path, sha: str, pages: Optional[str]) -> Tuple[Optional[Dict], int, List[int]]:
+    """(documento guardado o None, páginas del PDF, índices pedidos) sin extraer texto"""
+    document = await run_in_threadpool(text_store.document, sha)
+    try:
+        page_count = document['page_count'] if document else await run_in_process(count_pages, str(fpath))
+        return document, page_count, parse_pages(pages, page_count)
+    except PageRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to extract text: {e}")
-    return JSONResponse({"ok": True, "text": "\n\n".join(pages)})
\ No newline at end of file
+
+async def _stream_text(fpath: Path, sha: str, pages: Optional[str]) -> StreamingResponse:
+    """
+    NDJSON: una línea `{"page", "text"}` por página apenas está lista y una
+    línea final `{"done", "page_count", "cached"}` (o `{"error"}` si falla).
+    """
+    document, page_count, indices = await _requested_pages(fpath, sha, pages)
+
+    async def body():
+        try:
+            if document:
+                texts = await run_in_threadpool(text_store.get_pages, sha, indices)
+                for index, text in zip(indices, texts):
+                    yield _ndjson({"page": index + 1, "text": text})
+            else:
+                extracted = []
+                async for index, text in iter_pages_parallel(fpath, indices, STREAM_PAGES_PER_TASK):
+                    extracted.append(text)
+                    yield _ndjson({"page": index + 1, "text": text})
+                if len(indices) == page_count and indices == sorted(indices):
+                    # Documento completo: queda guardado para los próximos requests
+                    await run_in_threadpool(text_store.put_pages, sha, extracted)
+            yield _ndjson({"done": True, "page_count": page_count, "cached": document is not None})
+        except Exception as e:
+            print(f"❌ Error extrayendo texto de {sha[:12]}: {e}")
+            yield _ndjson({"error": f"Failed to extract text: {e}"})
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+@router.get("/text/{filename}")
+async def extract_text(
+    filename: str,
+    pages: Optional[str] = Query(None, description="Páginas a devolver, p. ej. 3-7 o 1,4,9-12 (por defecto todas)"),
+    stream: bool = Query(False, description="NDJSON: una línea por página a medida que se extrae")
+):
+    fpath, sha = await _resolve_upload(filename)
+    if sha is None:
+        sha = await run_in_threadpool(file_sha256, fpath)
+    if stream:
+        return await _stream_text(fpath, sha, pages)
+
+    if pages and not ingestion_queue.active(sha):
+        # Solo un rango: sin texto guardado se extraen nada más esas páginas
+        document, page_count, indices = await _requested_pages(fpath, sha, pages)
+        try:
+            if document:
+                texts = await run_in_threadpool(text_store.get_pages, sha, indices)
+            else:
+                texts = [text async for _, text in iter_pages_parallel(fpath, indices)]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to extract text: {e}")
+        cached = document is not None
+    else:
+        try:
+            all_pages, cached = await _document_text(fpath, sha)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to extract text: {e}")
+        try:
+            indices = parse_pages(pages, len(all_pages))
+        except PageRangeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        page_count, texts = len(all_pages), [all_pages[i] for i in indices]
+
+    payload = {
+        "ok": True,
+        "text": "\n\n".join(texts),
+        "pages": page_count,
+        "cached": cached
+    }
+    if pages:
+        payload["page_range"] = format_pages(indices)
+    return JSONResponse(payload)
@@ -1,9 +1,18 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, Response, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from api_integrators.text_integrator import TextIntegrator
 from api_integrators.ai_integrator import AIGenerator
 from streaming.pdf_streamer import PDFStreamer
+from streaming.pdf_prefetcher import PDFPrefetcher
 from cache.redis_cache import RedisCache
+from cache.blob_store import BlobStore
+from processing.pdf_pages import PDFPageSlicer
+from streaming.blob_response import blob_response
+from streaming.upstream import UpstreamBusy
 from utils.rate_limiter import APIRateLimiter, RateLimitException
+from utils.conditional import make_etag, body_etag, etag_matches, not_modified
+from utils.compression import serialize_json, store_precompressed, precompressed_response
+from utils.page_ranges import PageRangeError
 from models.schemas import (
     TextSearchRequest, 
     GenerateStudyGuideRequest, 
@@ -11,12 +20,19 @@ from models.schemas import (
     GenerateQuizRequest
 )
 import hashlib
+import os
 
 router = APIRouter()
 text_integrator = TextIntegrator()
 ai_generator = AIGenerator()
 cache = RedisCache()
-pdf_streamer = PDFStreamer(cache)
+blob_store = BlobStore()
+# PDF_CACHE_BACKEND=redis guarda los PDFs descargados en Redis por trozos (sin disco local)
+PDF_CACHE_BACKEND = os.getenv('PDF_CACHE_BACKEND', 'disk').lower()
+pdf_streamer = PDFStreamer(cache, blob_store if PDF_CACHE_BACKEND != 'redis' else None)
+pdf_prefetcher = PDFPrefetcher(pdf_streamer)
+pdf_streamer.on_range_miss = pdf_prefetcher.schedule_url
+page_slicer = PDFPageSlicer(blob_store)
 rate_limiter = APIRateLimiter()
 
 @router.post("/api/text/search", tags=["Text Resources"])
@@ -35,6 +51,9 @@ async def search_text_resources(
     
     Nota: El sistema combinará automáticamente subject y topic para la búsqueda.
     Ejemplo: subject="Cálculo", topic="integrales" → busca "Cálculo integrales"
+    
+    Responde con `ETag` (hash del cuerpo enviado); si el cliente manda el mismo
+    valor en `If-None-Match` se responde 304 sin cuerpo.
     """
     
     # Rate limiting
@@ -51,47 +70,69 @@ async def search_text_resources(
     # El topic ya está combinado por el validator de Pydantic
     combined_topic = body.topic
     
-    # Verifica cache
     cache_key = f"text:{body.language}:{body.grade_level}:{hashlib.md5(combined_topic.encode()).hexdigest()}"
-    cached_results = cache.get_json(cache_key)
-    
-    if cached_results:
-        return {
-            'success': True,
-            'results': cached_results,
-            'from_cache': True,
-            'query': combined_topic
-        }
     
-    # Busca recursos
-    try:
+    def search():
         print(f"\n🔎 Buscando recursos de texto...")
         print(f"   Query combinada: '{combined_topic}'")
         print(f"   Idioma: {body.language}")
         print(f"   Nivel: {body.grade_level}")
         
-        results = text_integrator.search_all(
+        found = text_integrator.search_all(
             topic=combined_topic,
             language=body.language,
             grade_level=body.grade_level,
             max_results=body.max_results
         )
         
-        print(f"✅ Encontrados {len(results)} recursos\n")
-        
-        # Guarda en cache por 2 horas
-        cache.set_json(cache_key, results, ttl=7200)
-        
-        return {
-            'success': True,
-            'results': results,
-            'from_cache': False,
-            'query': combined_topic,
-            'total': len(results)
-        }
+        print(f"✅ Encontrados {len(found)} recursos\n")
+        return found
+    
+    # Cache por 2 horas; un solo request reconstruye la key cuando expira
+    try:
+        results, from_cache, digest = await run_in_threadpool(
+            cache.get_or_compute_json, cache_key, search, ttl=7200
+        )
     except Exception as e:
         print(f"❌ Error en búsqueda: {e}")
         raise HTTPException(status_code=500, detail=f'Search failed: {str(e)}')
+    
+    cached_body = {
+        'success': True,
+        'results': results,
+        'from_cache': True,
+        'query': combined_topic
+    }
+    payload = cached_body if from_cache else {
+        'success': True,
+        'results': results,
+        'from_cache': False,
+        'query': combined_topic,
+        'total': len(results)
+    }
+    
+    # La ETag sale de los bytes que se envían: un hit y un miss son cuerpos distintos
+    content = serialize_json(payload)
+    etag = body_etag(content)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return not_modified(etag)
+    
+    if from_cache:
+        # Variante ya comprimida al llenar la cache: sin CPU de compresión por request
+        precompressed = await run_in_threadpool(
+            precompressed_response, cache, cache_key, digest,
+            request.headers.get('accept-encoding'), {'ETag': f"W/{etag}"}
+        )
+        if precompressed:
+            return precompressed
+    else:
+        if results:
+            # Igual que get_or_compute_json: sin resultados no hay envelope en cache
+            await run_in_threadpool(store_precompressed, cache, cache_key, digest, cached_body, 7200)
+        # Búsqueda nueva: se precargan los primeros PDFs para el próximo clic
+        pdf_prefetcher.schedule(results)
+    
+    return Response(content=content, media_type='application/json', headers={'ETag': etag})
 
 @router.post("/api/text/generate", tags=["AI Generation"])
 async def generate_study_guide(
@@ -280,9 +321,68 @@ async def export_text_to_pdf(id: str):
         raise HTTPException(status_code=500, detail=f'Export failed: {str(e)}')
 
 @router.get("/api/text/stream-pdf", tags=["Streaming"])
-async def stream_pdf(url: str):
-    """Hace streaming de PDF a través del servidor"""
+async def stream_pdf(request: Request, url: str):
+    """
+    Hace streaming de PDF a través del servidor
+    
+    Soporta `Range` (206) para que el visor cargue el PDF por partes y
+    `If-None-Match` (304) para no reenviar un PDF que el cliente ya tiene.
+    """
+    if not url:
+        raise HTTPException(status_code=400, detail='URL parameter required')
+    
+    return await pdf_streamer.stream_pdf(
+        url,
+        range_header=request.headers.get('range'),
+        if_none_match=request.headers.get('if-none-match')
+    )
+
+@router.get("/api/text/pdf-pages", tags=["Streaming"])
+async def stream_pdf_pages(
+    request: Request,
+    url: str,
+    pages: str = Query(..., description="Páginas a incluir, p. ej. 3-7 o 1,4,9-12")
+):
+    """
+    Devuelve un PDF nuevo con solo las páginas pedidas de un PDF externo.
+    
+    El PDF completo se baja una vez a la cache (si no estaba) y los recortes
+    se guardan por (sha256 del PDF, rango): el mismo recorte no se rehace.
+    """
     if not url:
         raise HTTPException(status_code=400, detail='URL parameter required')
     
-    return pdf_streamer.stream_pdf(url)
\ No newline at end of file
+    if pdf_streamer.blob_store is None:
+        raise HTTPException(status_code=501, detail='Page extraction requires PDF_CACHE_BACKEND=disk')
+    
+    cache_key = PDFStreamer.cache_key(url)
+    source = await run_in_threadpool(blob_store.resolve, cache_key)
+    if source is None:
+        try:
+            await pdf_streamer.fetch_to_cache(url)
+        except UpstreamBusy as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '5'})
+        except Exception as e:
+            print(f"❌ Error descargando PDF: {e}")
+            raise HTTPException(status_code=502, detail=f'Failed to fetch PDF: {str(e)}')
+        source = await run_in_threadpool(blob_store.resolve, cache_key)
+        if source is None:
+            raise HTTPException(status_code=502, detail='Failed to fetch PDF')
+    
+    try:
+        entry = await page_slicer.slice(source['path'], pages, source_sha=source['sha'])
+    except PageRangeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"❌ Error recortando PDF: {e}")
+        raise HTTPException(status_code=422, detail=f'Failed to split PDF: {str(e)}')
+    
+    etag = make_etag(entry['sha'])
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return not_modified(etag)
+    return blob_response(
+        entry['path'],
+        'application/pdf',
+        headers={'ETag': etag, 'Content-Disposition': 'inline'},
+        range_header=request.headers.get('range')
+    )
@@ -4,10 +4,13 @@ Convertido de Flask a FastAPI
 Modelo actualizado: sora-2 (Noviembre 2025)
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 from typing import Optional, List
 import hashlib
+from utils.conditional import body_etag, json_digest, etag_matches, not_modified
+from utils.compression import serialize_json, store_precompressed, precompressed_response
 
 # Importaciones
 try:
@@ -15,6 +18,7 @@ try:
     from api_integrators.ai_integrator import AIGenerator
     from api_integrators.video_generator import VideoGenerator
     from streaming.video_streamer import VideoStreamer
+    from cache.video_prefix_cache import VideoPrefixCache
     from cache.redis_cache import RedisCache
 except ImportError as e:
     print(f"⚠️ Importación opcional no disponible: {e}")
@@ -22,6 +26,7 @@ except ImportError as e:
     AIGenerator = None
     VideoGenerator = None
     VideoStreamer = None
+    VideoPrefixCache = None
     RedisCache = None
 
 router = APIRouter()
@@ -30,7 +35,8 @@ router = APIRouter()
 video_integrator = VideoIntegrator() if VideoIntegrator else None
 ai_generator = AIGenerator() if AIGenerator else None
 video_generator = VideoGenerator() if VideoGenerator else None
-video_streamer = VideoStreamer() if VideoStreamer else None
+video_prefix_cache = VideoPrefixCache() if VideoPrefixCache else None
+video_streamer = VideoStreamer(prefix_cache=video_prefix_cache) if VideoStreamer else None
 cache = RedisCache() if RedisCache else None
 
 
@@ -119,36 +125,23 @@ class FullVideoGenerationRequest(BaseModel):
 # ==========================================
 
 @router.post("/api/videos/search", tags=["Videos"])
-async def search_videos(body: VideoSearchRequest):
+async def search_videos(request: Request, body: VideoSearchRequest):
     """
     🔍 Busca videos educativos en múltiples plataformas
     
     - Busca en YouTube, Vimeo, etc.
     - Usa cache para resultados recientes
     - Retorna metadata completa de cada video
+    - `ETag` (hash del cuerpo enviado) + `If-None-Match` → 304 si no cambió
     """
     
     if not body.topic:
         raise HTTPException(status_code=400, detail="Topic is required")
     
-    # Check cache
-    if cache:
-        cache_key = f"videos:{hashlib.md5(body.topic.encode()).hexdigest()}"
-        cached_results = cache.get_json(cache_key)
-        
-        if cached_results:
-            return {
-                'success': True,
-                'results': cached_results,
-                'from_cache': True,
-                'count': len(cached_results)
-            }
-    
-    # Search videos
-    try:
+    def search():
         if not video_integrator:
             # Datos de ejemplo
-            results = [
+            return [
                 {
                     "title": f"Tutorial: {body.topic}",
                     "url": "https://www.youtube.com/watch?v=example",
@@ -157,19 +150,46 @@ async def search_videos(body: VideoSearchRequest):
                     "thumbnail": "https://via.placeholder.com/480x360"
                 }
             ]
-        else:
-            results = video_integrator.search_all(body.topic, body.max_results)
-        
-        # Cache results
+        return video_integrator.search_all(body.topic, body.max_results)
+    
+    # Search videos (cache 1 hora; un solo request reconstruye la key cuando expira)
+    try:
         if cache:
-            cache.set_json(cache_key, results, ttl=3600)
+            cache_key = f"videos:{hashlib.md5(body.topic.encode()).hexdigest()}"
+            results, from_cache, digest = await run_in_threadpool(
+                cache.get_or_compute_json, cache_key, search, ttl=3600
+            )
+        else:
+            results, from_cache = await run_in_threadpool(search), False
+            digest = json_digest(results)
         
-        return {
+        cached_body = {
             'success': True,
             'results': results,
-            'from_cache': False,
+            'from_cache': True,
             'count': len(results)
         }
+        payload = cached_body if from_cache else {**cached_body, 'from_cache': False}
+        
+        # La ETag sale de los bytes que se envían: un hit y un miss son cuerpos distintos
+        content = serialize_json(payload)
+        etag = body_etag(content)
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            return not_modified(etag)
+        
+        if cache and from_cache:
+            # Variante ya comprimida al llenar la cache: sin CPU de compresión por request
+            precompressed = await run_in_threadpool(
+                precompressed_response, cache, cache_key, digest,
+                request.headers.get('accept-encoding'), {'ETag': f"W/{etag}"}
+            )
+            if precompressed:
+                return precompressed
+        elif cache and results:
+            # Igual que get_or_compute_json: sin resultados no hay envelope en cache
+            await run_in_threadpool(store_precompressed, cache, cache_key, digest, cached_body, 3600)
+        
+        return Response(content=content, media_type='application/json', headers={'ETag': etag})
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f'Search failed: {str(e)}')
@@ -341,11 +361,12 @@ async def full_generation(body: FullVideoGenerationRequest):
 
 
 @router.get("/api/videos/stream", tags=["Videos"])
-async def stream_video(url: str = Query(..., description="URL del video a streamear")):
+async def stream_video(request: Request, url: str = Query(..., description="URL del video a streamear")):
     """
     📺 Stream de video a través del servidor
     
-    Útil para videos con restricciones CORS
+    Útil para videos con restricciones CORS. Soporta `Range` (responde 206),
+    así el reproductor puede adelantar sin volver a descargar desde el inicio.
     """
     
     if not url:
@@ -354,7 +375,7 @@ async def stream_video(url: str = Query(..., description="URL del video a stream
     try:
         if not video_streamer:
             return {'success': True, 'redirect_url': url}
-        return video_streamer.stream_video(url)
+        return await video_streamer.stream_video(url, range_header=request.headers.get('range'))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -0,0 +1,93 @@
+import os
+import anyio
+from pathlib import Path
+from typing import Optional, Dict, Tuple
+from fastapi.responses import FileResponse, Response
+from utils.http_range import parse_range, content_range, RangeNotSatisfiable
+
+
+class BlobFileResponse(FileResponse):
+    """
+    FileResponse que entrega el archivo con sendfile cuando el servidor ASGI
+    soporta la extensión `http.response.zerocopy` (el kernel copia los bytes
+    del disco al socket sin pasar por Python). Si no la soporta, se comporta
+    igual que FileResponse: lectura en trozos, nunca el archivo completo en memoria.
+
+    Con `byte_range=(start, end)` responde 206 con solo ese segmento.
+    """
+
+    def __init__(self, path, byte_range: Optional[Tuple[int, int]] = None, **kwargs):
+        super().__init__(path, **kwargs)
+        self.headers.setdefault("accept-ranges", "bytes")
+        self.byte_range = byte_range
+        if byte_range is not None:
+            start, end = byte_range
+            self.status_code = 206
+            self.headers["content-range"] = content_range(start, end, self.stat_result.st_size)
+            self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        extensions = scope.get("extensions") or {}
+        zerocopy = "http.response.zerocopy" in extensions
+        head = scope.get("method") == "HEAD"
+        if self.byte_range is None and (not zerocopy or head):
+            await super().__call__(scope, receive, send)
+            return
+
+        size = (self.stat_result or os.stat(self.path)).st_size
+        start, end = self.byte_range or (0, size - 1)
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if head:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif zerocopy:
+            with open(self.path, "rb") as f:
+                await send({
+                    "type": "http.response.zerocopy",
+                    "file": f,
+                    "offset": start,
+                    "count": end - start + 1,
+                    "more_body": False,
+                })
+        else:
+            async with await anyio.open_file(self.path, mode="rb") as f:
+                await f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = await f.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    })
+                if remaining > 0:
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def blob_response(path: Path, media_type: str, headers: Optional[Dict] = None,
+                  filename: Optional[str] = None, range_header: Optional[str] = None) -> Response:
+    """
+    Respuesta para un blob en disco con Content-Length ya calculado.
+    Si `range_header` pide un rango válido responde 206; si no se puede satisfacer, 416.
+    """
+    stat_result = os.stat(path)
+    try:
+        byte_range = parse_range(range_header, stat_result.st_size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{stat_result.st_size}"})
+    return BlobFileResponse(
+        path,
+        byte_range=byte_range,
+        media_type=media_type,
+        headers=headers,
+        filename=filename,
+        stat_result=stat_result
+    )
@@ -0,0 +1,96 @@
+import os
+import time
+import asyncio
+from typing import Dict, List, Set
+
+
+class PDFPrefetcher:
+    """
+    Precarga en segundo plano los PDFs de los primeros resultados de una búsqueda,
+    así el primer clic en /api/text/stream-pdf se sirve desde la cache local.
+
+    Es de baja prioridad y acotado:
+    - `top_n` PDFs por búsqueda, como máximo `max_concurrency` descargas a la vez
+    - PDFs de más de `max_pdf_bytes` se descartan
+    - Presupuesto de `hourly_byte_budget` bytes descargados por hora
+    - Cede el paso al tráfico real: no descarga de un host con cola de espera
+      o con la mitad de su límite de conexiones ocupado
+    """
+
+    def __init__(self, pdf_streamer, top_n: int = None, max_concurrency: int = None,
+                 max_pdf_bytes: int = None, hourly_byte_budget: int = None):
+        self.pdf_streamer = pdf_streamer
+        self.pool = pdf_streamer.pool
+        self.top_n = top_n or int(os.getenv('PREFETCH_TOP_N', 3))
+        self.max_pdf_bytes = max_pdf_bytes or int(os.getenv('PREFETCH_MAX_PDF_BYTES', 40 * 1024 * 1024))
+        self.hourly_byte_budget = hourly_byte_budget or int(os.getenv('PREFETCH_HOURLY_BYTES', 1024 ** 3))
+        self._slots = asyncio.Semaphore(max_concurrency or int(os.getenv('PREFETCH_CONCURRENCY', 2)))
+        self._inflight: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._window_start = time.time()
+        self._window_bytes = 0
+        self.stats = {'scheduled': 0, 'prefetched': 0, 'skipped': 0, 'failed': 0, 'bytes': 0}
+
+    def _budget_left(self) -> int:
+        if time.time() - self._window_start >= 3600:
+            self._window_start = time.time()
+            self._window_bytes = 0
+        return self.hourly_byte_budget - self._window_bytes
+
+    def schedule(self, results: List[Dict]):
+        """Programa la precarga de los top-N PDFs de `results` (no bloquea)"""
+        urls = []
+        for item in results:
+            pdf_url = item.get('pdf_url') if isinstance(item, dict) else None
+            if pdf_url and pdf_url not in urls:
+                urls.append(pdf_url)
+            if len(urls) >= self.top_n:
+                break
+
+        for pdf_url in urls:
+            self.schedule_url(pdf_url)
+
+    def schedule_url(self, pdf_url: str):
+        """Programa la descarga completa de un PDF a la cache (no bloquea)"""
+        if pdf_url in self._inflight:
+            return
+        self._inflight.add(pdf_url)
+        self.stats['scheduled'] += 1
+        task = asyncio.create_task(self._prefetch(pdf_url))
+        # Se guarda la referencia para que la tarea no sea recolectada
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _prefetch(self, pdf_url: str):
+        try:
+            async with self._slots:
+                load = self.pool.host_load(pdf_url)
+                busy = load['queued'] > 0 or load['active'] >= self.pool.per_host_limit // 2
+                if busy or self._budget_left() <= 0:
+                    self.stats['skipped'] += 1
+                    return
+                if await asyncio.to_thread(self.pdf_streamer.is_cached, pdf_url):
+                    self.stats['skipped'] += 1
+                    return
+
+                max_bytes = min(self.max_pdf_bytes, self._budget_left())
+                fetched = await self.pdf_streamer.fetch_to_cache(pdf_url, max_bytes=max_bytes)
+                if fetched:
+                    self._window_bytes += fetched
+                    self.stats['prefetched'] += 1
+                    self.stats['bytes'] += fetched
+                    print(f"📥 PDF precargado: {pdf_url} ({fetched} bytes)")
+                else:
+                    self.stats['skipped'] += 1
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"PDF prefetch error: {e}")
+        finally:
+            self._inflight.discard(pdf_url)
+
+    def metrics(self) -> Dict:
+        return {
+            **self.stats,
+            'inflight': len(self._inflight),
+            'budget_left': self._budget_left()
+        }
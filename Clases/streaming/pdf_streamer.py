@@ -1,46 +1,230 @@
 import requests
 import hashlib
+import httpx
 from fastapi import HTTPException
-from fastapi.responses import Response
-from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import Optional, AsyncIterator, Callable
+from streaming.blob_response import blob_response
+from streaming.upstream import UpstreamPool, UpstreamBusy, upstream_pool, upstream_etag
+from utils.http_range import parse_range, content_range, RangeNotSatisfiable
+from utils.conditional import make_etag, etag_matches, not_modified
 import io
 
+# Los PDFs descargados se reutilizan por 24 horas
+PDF_CACHE_TTL = 86400
+
 class PDFStreamer:
-    def __init__(self, cache_manager):
+    def __init__(self, cache_manager, blob_store=None, pool: UpstreamPool = None):
         self.cache = cache_manager
+        # Con blob_store los PDFs viven en disco; sin él, en Redis por trozos
+        self.blob_store = blob_store
+        self.pool = pool or upstream_pool
+        # Se llama con la URL cuando un Range llega sin el PDF en cache (p. ej. el prefetcher)
+        self.on_range_miss: Optional[Callable[[str], None]] = None
+    
+    @staticmethod
+    def cache_key(pdf_url: str) -> str:
+        return f"pdf:{hashlib.md5(pdf_url.encode()).hexdigest()}"
     
-    def stream_pdf(self, pdf_url: str) -> Response:
-        """Stream PDF through your server with caching"""
-        cache_key = f"pdf:{hashlib.md5(pdf_url.encode()).hexdigest()}"
+    async def stream_pdf(self, pdf_url: str, range_header: Optional[str] = None,
+                         if_none_match: Optional[str] = None) -> Response:
+        """
+        Stream PDF through your server with caching
         
-        # Check cache first
-        cached_pdf = self.cache.get(cache_key)
-        if cached_pdf:
-            return Response(
-                content=cached_pdf,
-                media_type='application/pdf',
-                headers={'Content-Disposition': 'inline'}
-            )
+        Soporta `Range` tanto para PDFs en cache como para el upstream, así los
+        visores (pdf.js) muestran la primera página sin bajar el archivo completo.
+        Los PDFs en cache llevan ETag (sha256 del contenido) y responden 304
+        a `If-None-Match`.
+        """
+        cache_key = self.cache_key(pdf_url)
+        
+        # SQLite del blob store o Redis: bloqueante, va al threadpool
+        cached = await run_in_threadpool(self._cached_response, cache_key, range_header, if_none_match)
+        if cached is not None:
+            return cached
         
-        # Download PDF
         try:
-            response = requests.get(pdf_url, timeout=30)
-            response.raise_for_status()
-            pdf_data = response.content
-            
-            # Cache for 24 hours
-            self.cache.set(cache_key, pdf_data, ttl=86400)
+            if range_header:
+                # Rango sobre un PDF no cacheado: se pide solo ese rango al upstream
+                # y el PDF completo se baja en segundo plano para los próximos rangos
+                if self.on_range_miss is not None:
+                    self.on_range_miss(pdf_url)
+                return await self.pool.proxy(
+                    pdf_url,
+                    range_header=range_header,
+                    default_media_type='application/pdf',
+                    headers={'Content-Disposition': 'inline'}
+                )
             
-            return Response(
-                content=pdf_data,
+            # Descarga: se reenvía al cliente mientras se llena la cache
+            upstream = await self.pool.open(pdf_url)
+            headers = {'Content-Disposition': 'inline', 'Accept-Ranges': 'bytes'}
+            # Mientras no está en cache no hay sha propio: se usa el validador del upstream
+            etag = upstream_etag(upstream)
+            if etag:
+                if etag_matches(if_none_match, etag):
+                    await self.pool.close(upstream)
+                    return not_modified(etag, {'Accept-Ranges': 'bytes'})
+                headers['ETag'] = etag
+            if upstream.headers.get('content-length'):
+                headers['Content-Length'] = upstream.headers['content-length']
+            return StreamingResponse(
+                self._tee(pdf_url, upstream),
                 media_type='application/pdf',
-                headers={'Content-Disposition': 'inline'}
+                headers=headers,
+                # Si el cuerpo nunca arranca (cliente se fue antes), el lugar del host igual se libera
+                background=BackgroundTask(self.pool.close, upstream)
             )
+        except UpstreamBusy as e:
+            print(f"PDF streaming error: {e}")
+            raise HTTPException(status_code=503, detail=str(e), headers={'Retry-After': '5'})
         except Exception as e:
             print(f"PDF streaming error: {e}")
             # En lugar de Response con status=500, lanzamos HTTPException para FastAPI
             raise HTTPException(status_code=500, detail=f"Error streaming PDF: {str(e)}")
     
+    def _cached_response(self, cache_key: str, range_header: Optional[str],
+                         if_none_match: Optional[str] = None) -> Optional[Response]:
+        """Respuesta (completa, 206 o 304) desde el blob store o Redis, o None si no está en cache"""
+        if self.blob_store:
+            entry = self.blob_store.resolve(cache_key)
+            if not entry:
+                return None
+            etag = make_etag(entry['sha'])
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag, {'Accept-Ranges': 'bytes'})
+            return blob_response(
+                entry['path'], 'application/pdf',
+                headers={'Content-Disposition': 'inline', 'ETag': etag},
+                range_header=range_header
+            )
+        
+        # El PDF se guarda en Redis en trozos: se envía trozo a trozo
+        manifest = self.cache.get_blob_manifest(cache_key)
+        if not manifest or not self.cache.blob_complete(cache_key, manifest):
+            return None
+        size = manifest['size']
+        headers = {'Content-Disposition': 'inline', 'Accept-Ranges': 'bytes'}
+        if manifest.get('sha256'):
+            headers['ETag'] = make_etag(manifest['sha256'])
+            if etag_matches(if_none_match, headers['ETag']):
+                return not_modified(headers['ETag'], {'Accept-Ranges': 'bytes'})
+        try:
+            byte_range = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={'Content-Range': f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            headers['Content-Range'] = content_range(start, end, size)
+            headers['Content-Length'] = str(end - start + 1)
+            return StreamingResponse(
+                self.cache.iter_blob(cache_key, start, end, manifest),
+                status_code=206,
+                media_type='application/pdf',
+                headers=headers
+            )
+        headers['Content-Length'] = str(size)
+        return StreamingResponse(
+            self.cache.iter_blob(cache_key, manifest=manifest),
+            media_type='application/pdf',
+            headers=headers
+        )
+    
+    def _open_cache_writer(self, pdf_url: str):
+        """Writer del blob store o de Redis para el PDF de `pdf_url`"""
+        if self.blob_store:
+            return self.blob_store.open_writer('application/pdf')
+        return self.cache.open_blob_writer(self.cache_key(pdf_url), ttl=PDF_CACHE_TTL, content_type='application/pdf')
+    
+    def _commit_cache_writer(self, pdf_url: str, writer):
+        if self.blob_store:
+            sha = writer.commit()
+            self.blob_store.link(self.cache_key(pdf_url), sha, meta={'url': pdf_url}, ttl=PDF_CACHE_TTL)
+        else:
+            writer.commit()
+    
+    async def _tee(self, pdf_url: str, upstream: httpx.Response) -> AsyncIterator[bytes]:
+        """
+        Envía los trozos del upstream al cliente apenas llegan y los escribe en
+        la cache en paralelo. La memoria por request queda acotada por el buffer
+        del relay. Solo una descarga completa se vuelve entrada de cache; si el
+        cliente o el upstream cortan antes, lo escrito se descarta.
+        """
+        length = upstream.headers.get('content-length')
+        expected = int(length) if length and length.isdigit() else None
+        writer = None
+        chunks = self.pool.relay(upstream)
+        caching = True
+        completed = False
+        try:
+            try:
+                writer = await run_in_threadpool(self._open_cache_writer, pdf_url)
+            except Exception as e:
+                # Sin cache (disco lleno, Redis caído) el PDF igual llega al cliente
+                print(f"PDF cache write error: {e}")
+                caching = False
+            async for chunk in chunks:
+                if caching:
+                    try:
+                        await run_in_threadpool(writer.write, chunk)
+                    except Exception as e:
+                        # Un fallo de la cache no debe cortar el stream al cliente
+                        print(f"PDF cache write error: {e}")
+                        caching = False
+                        await run_in_threadpool(writer.abort)
+                yield chunk
+            if caching and (expected is None or writer.size == expected):
+                await run_in_threadpool(self._commit_cache_writer, pdf_url, writer)
+                completed = True
+        finally:
+            await chunks.aclose()
+            await self.pool.close(upstream)
+            if caching and not completed:
+                await run_in_threadpool(writer.abort)
+    
+    def is_cached(self, pdf_url: str) -> bool:
+        cache_key = self.cache_key(pdf_url)
+        if self.blob_store:
+            return self.blob_store.resolve(cache_key) is not None
+        manifest = self.cache.get_blob_manifest(cache_key)
+        return bool(manifest) and self.cache.blob_complete(cache_key, manifest)
+    
+    async def fetch_to_cache(self, pdf_url: str, max_bytes: Optional[int] = None) -> int:
+        """
+        Descarga un PDF a la cache sin cliente esperando (prefetch).
+        Si supera `max_bytes` se aborta y no queda nada en cache.
+        
+        Returns:
+            Bytes descargados y guardados (0 si se descartó)
+        """
+        upstream = await self.pool.open(pdf_url)
+        length = upstream.headers.get('content-length')
+        if max_bytes and length and length.isdigit() and int(length) > max_bytes:
+            await self.pool.close(upstream)
+            return 0
+        
+        writer = None
+        completed = False
+        chunks = self.pool.relay(upstream)
+        try:
+            writer = await run_in_threadpool(self._open_cache_writer, pdf_url)
+            async for chunk in chunks:
+                if max_bytes and writer.size + len(chunk) > max_bytes:
+                    return 0
+                await run_in_threadpool(writer.write, chunk)
+            if length and length.isdigit() and writer.size != int(length):
+                return 0
+            await run_in_threadpool(self._commit_cache_writer, pdf_url, writer)
+            completed = True
+            return writer.size
+        finally:
+            await chunks.aclose()
+            await self.pool.close(upstream)
+            if writer is not None and not completed:
+                await run_in_threadpool(writer.abort)
+    
     def download_and_cache_pdf(self, pdf_url: str) -> Optional[bytes]:
         """Download PDF and return bytes"""
         try:
@@ -0,0 +1,349 @@
+import os
+import asyncio
+import contextlib
+import hashlib
+import httpx
+from urllib.parse import urlsplit
+from typing import AsyncIterator, Callable, Dict, Optional
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+from utils.http_range import parse_range, content_range, slice_stream, RangeNotSatisfiable
+
+# Tamaño de cada lectura del upstream y trozos en buffer por stream
+UPSTREAM_CHUNK_SIZE = 64 * 1024
+STREAM_BUFFER_CHUNKS = 8
+# Segundos máximos esperando que termine la tarea lectora de un relay cerrado
+RELAY_STOP_TIMEOUT = 5.0
+
+
+class UpstreamBusy(Exception):
+    """No hubo lugar en el límite de conexiones del host a tiempo (HTTP 503)"""
+    pass
+
+
+class UpstreamStalled(Exception):
+    """El upstream dejó de mandar datos a un ritmo útil"""
+    pass
+
+
+def upstream_etag(upstream: httpx.Response) -> Optional[str]:
+    """
+    ETag para reenviar una respuesta del upstream: la suya si la trae (los bytes
+    se retransmiten tal cual), o una débil derivada de URL, Last-Modified y
+    tamaño total. None si el upstream no da ningún validador.
+    """
+    tag = upstream.headers.get('etag')
+    if tag:
+        return tag
+    last_modified = upstream.headers.get('last-modified')
+    if not last_modified:
+        return None
+    total = upstream.headers.get('content-range', '').rpartition('/')[2] or upstream.headers.get('content-length', '')
+    digest = hashlib.sha256(f"{upstream.url}|{last_modified}|{total}".encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+class UpstreamPool:
+    """
+    Pool de conexiones HTTP asíncrono compartido por los proxies de streaming.
+
+    Un solo httpx.AsyncClient reutiliza conexiones keep-alive entre requests,
+    así un worker puede retransmitir cientos de streams sin un hilo por cliente.
+
+    Protecciones contra upstreams lentos:
+    - Límite de conexiones por host con cola de espera (`queue_timeout`)
+    - Idle timeout: sin bytes durante `idle_timeout` segundos se corta la lectura
+    - Stall timeout: si un trozo completo tarda más de `stall_window` segundos
+      en llegar (el upstream manda bytes, pero a un goteo inútil), se aborta
+    """
+
+    def __init__(self, max_connections: int = 500, max_keepalive: int = 100,
+                 timeout: float = 30.0, per_host_limit: Optional[int] = None,
+                 queue_timeout: float = 10.0, idle_timeout: float = 20.0,
+                 stall_window: float = 30.0):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive
+        )
+        self.timeout = httpx.Timeout(timeout, connect=10.0, read=idle_timeout)
+        self.per_host_limit = per_host_limit or int(os.getenv('UPSTREAM_PER_HOST_LIMIT', 16))
+        self.queue_timeout = queue_timeout
+        self.stall_window = stall_window
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        self._host_stats: Dict[str, Dict[str, int]] = {}
+        # id(response) -> host, para liberar el lugar una sola vez
+        self._held: Dict[int, str] = {}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=self.limits,
+                timeout=self.timeout,
+                follow_redirects=True
+            )
+        return self._client
+
+    def _stats(self, host: str) -> Dict[str, int]:
+        if host not in self._host_stats:
+            self._host_stats[host] = {
+                'active': 0, 'queued': 0, 'opened': 0,
+                'rejected': 0, 'stalled': 0, 'idle_timeouts': 0
+            }
+        return self._host_stats[host]
+
+    async def _acquire(self, host: str):
+        slots = self._host_slots.setdefault(host, asyncio.Semaphore(self.per_host_limit))
+        stats = self._stats(host)
+        stats['queued'] += 1
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            stats['rejected'] += 1
+            raise UpstreamBusy(f"Too many concurrent connections to {host}")
+        finally:
+            stats['queued'] -= 1
+        stats['active'] += 1
+        stats['opened'] += 1
+
+    def _release(self, host: str):
+        self._host_slots[host].release()
+        self._stats(host)['active'] -= 1
+
+    async def close(self, response: httpx.Response):
+        """Cierra la respuesta del upstream y libera su lugar en el límite del host"""
+        try:
+            await response.aclose()
+        finally:
+            host = self._held.pop(id(response), None)
+            if host is not None:
+                self._release(host)
+
+    async def open(self, url: str, headers: Optional[Dict[str, str]] = None) -> httpx.Response:
+        """
+        Abre un GET en modo stream (solo headers leídos; el cuerpo queda pendiente).
+        Ocupa un lugar del límite del host hasta que se llame `close()`.
+
+        Raises:
+            UpstreamBusy: si no se consiguió lugar en `queue_timeout` segundos
+        """
+        host = urlsplit(url).netloc.lower()
+        await self._acquire(host)
+        # identity: los bytes se retransmiten tal cual y Content-Length sigue siendo válido
+        request = self.client.build_request("GET", url, headers={'Accept-Encoding': 'identity', **(headers or {})})
+        try:
+            response = await self.client.send(request, stream=True)
+        except BaseException:
+            self._release(host)
+            raise
+        self._held[id(response)] = host
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError:
+            await self.close(response)
+            raise
+        return response
+
+    async def relay(self, response: httpx.Response, chunk_size: int = UPSTREAM_CHUNK_SIZE,
+                    buffer_chunks: int = STREAM_BUFFER_CHUNKS) -> AsyncIterator[bytes]:
+        """
+        Retransmite el cuerpo del upstream con un buffer acotado.
+
+        Una tarea lee del upstream hacia una cola de `buffer_chunks` trozos; si el
+        cliente es lento la cola se llena, la tarea deja de leer y TCP frena al
+        upstream (backpressure). Si el cliente se desconecta, la conexión se cierra.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_chunks)
+        # El consumidor se fue: el pump no debe quedar bloqueado en la cola llena.
+        # No se depende de task.cancel(): en 3.11 wait_for puede tragarse la
+        # cancelación si llega justo cuando termina la lectura.
+        stop = asyncio.Event()
+
+        host = self._held.get(id(response), urlsplit(str(response.url)).netloc.lower())
+
+        async def put(item) -> bool:
+            """Encola `item` esperando lugar, salvo que se pida parar (devuelve False)"""
+            try:
+                queue.put_nowait(item)
+                return True
+            except asyncio.QueueFull:
+                pass
+            putter = asyncio.ensure_future(queue.put(item))
+            stopper = asyncio.ensure_future(stop.wait())
+            try:
+                await asyncio.wait({putter, stopper}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                putter.cancel()
+                stopper.cancel()
+            return putter.done() and not putter.cancelled()
+
+        async def pump():
+            chunks = response.aiter_bytes(chunk_size)
+            try:
+                while not stop.is_set():
+                    # Solo se mide la espera al upstream, no el tiempo bloqueado por
+                    # un cliente lento (eso es backpressure, no un upstream estancado)
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), timeout=self.stall_window)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self._stats(host)['stalled'] += 1
+                        raise UpstreamStalled(
+                            f"Upstream {host} sent less than {chunk_size} bytes in {self.stall_window:g}s"
+                        )
+                    if not await put(chunk):
+                        return
+                await put(None)
+            except httpx.ReadTimeout as e:
+                self._stats(host)['idle_timeouts'] += 1
+                await put(e)
+            except Exception as e:
+                await put(e)
+
+        task = asyncio.create_task(pump())
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            while not queue.empty():
+                queue.get_nowait()
+            try:
+                # Cerrar primero libera el lugar del host y hace fallar la lectura en curso
+                await self.close(response)
+            finally:
+                task.cancel()
+                # Espera acotada: un pump trabado no puede colgar al consumidor
+                await asyncio.wait({task}, timeout=RELAY_STOP_TIMEOUT)
+                if task.done() and not task.cancelled():
+                    task.exception()
+
+    async def proxy(self, url: str, range_header: Optional[str] = None,
+                    default_media_type: str = 'application/octet-stream',
+                    headers: Optional[Dict[str, str]] = None,
+                    chunk_size: int = UPSTREAM_CHUNK_SIZE,
+                    tap: Optional[Callable[[httpx.Response, AsyncIterator[bytes]], AsyncIterator[bytes]]] = None) -> Response:
+        """
+        Retransmite `url` al cliente respetando su header Range.
+
+        El rango se reenvía al upstream; si responde 206 se pasa tal cual. Si lo
+        ignora (200 con Content-Length), el rango se recorta aquí y se responde
+        206 igualmente; sin tamaño conocido se manda el recurso completo.
+
+        La ETag del upstream (o una derivada con `upstream_etag`) se reenvía.
+
+        `tap(upstream, chunks)` puede envolver el cuerpo tal como llega del
+        upstream (antes de recortar), p. ej. para guardar una copia en cache.
+
+        Raises:
+            httpx.HTTPError: si el upstream falla (salvo 416, que se responde)
+        """
+        try:
+            upstream = await self.open(url, headers={'Range': range_header} if range_header else None)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 416:
+                return Response(
+                    status_code=416,
+                    headers={'Content-Range': e.response.headers.get('content-range', 'bytes */*')}
+                )
+            raise
+
+        try:
+            return self._proxy_response(upstream, range_header, default_media_type,
+                                        headers, chunk_size, tap)
+        except BaseException:
+            await self.close(upstream)
+            raise
+
+    def _proxy_response(self, upstream: httpx.Response, range_header: Optional[str],
+                        default_media_type: str, headers: Optional[Dict[str, str]],
+                        chunk_size: int, tap) -> Response:
+        # El lugar del host se toma en open() y lo libera el relay; si el cuerpo
+        # nunca arranca (cliente desconectado antes), lo libera esta tarea.
+        # close() es idempotente, así que tras un relay completo no hace nada.
+        release = BackgroundTask(self.close, upstream)
+        body = self.relay(upstream, chunk_size=chunk_size)
+        if tap is not None:
+            body = tap(upstream, body)
+        media_type = upstream.headers.get('content-type', default_media_type)
+        out_headers = {'Accept-Ranges': 'bytes', **(headers or {})}
+        etag = upstream_etag(upstream)
+        if etag and 'ETag' not in out_headers:
+            out_headers['ETag'] = etag
+        length = upstream.headers.get('content-length')
+
+        if upstream.status_code == 206:
+            # El upstream ya resolvió el rango: se reenvía tal cual
+            out_headers['Content-Range'] = upstream.headers.get('content-range', '')
+            if length:
+                out_headers['Content-Length'] = length
+            return StreamingResponse(
+                body,
+                status_code=206,
+                media_type=media_type,
+                headers=out_headers,
+                background=release
+            )
+
+        size = int(length) if length and length.isdigit() else None
+        try:
+            byte_range = parse_range(range_header, size) if size is not None else None
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={'Content-Range': f"bytes */{size}"}, background=release)
+
+        if byte_range:
+            # Upstream sin soporte de rangos: se descarta el prefijo y se recorta
+            start, end = byte_range
+            out_headers['Content-Range'] = content_range(start, end, size)
+            out_headers['Content-Length'] = str(end - start + 1)
+            return StreamingResponse(
+                slice_stream(body, start, end),
+                status_code=206,
+                media_type=media_type,
+                headers=out_headers,
+                background=release
+            )
+
+        if length:
+            out_headers['Content-Length'] = length
+        if range_header and size is None:
+            # Sin tamaño conocido no se puede emular el rango: se manda completo
+            out_headers['Accept-Ranges'] = 'none'
+
+        return StreamingResponse(
+            body,
+            media_type=media_type,
+            headers=out_headers,
+            background=release
+        )
+
+    def host_load(self, url: str) -> Dict[str, int]:
+        """Conexiones activas y en cola hacia el host de `url`"""
+        stats = self._stats(urlsplit(url).netloc.lower())
+        return {'active': stats['active'], 'queued': stats['queued']}
+
+    def metrics(self) -> Dict:
+        """Conexiones activas y en cola por host, más totales"""
+        hosts = {host: dict(stats) for host, stats in self._host_stats.items()}
+        return {
+            'per_host_limit': self.per_host_limit,
+            'active': sum(h['active'] for h in hosts.values()),
+            'queued': sum(h['queued'] for h in hosts.values()),
+            'hosts': hosts
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Compartido por todos los streamers del proceso
+upstream_pool = UpstreamPool()
@@ -1,34 +1,62 @@
-import requests
+import asyncio
+import anyio
+import httpx
+from typing import Dict, Optional
 from fastapi.responses import StreamingResponse, Response
-from typing import Generator
+from streaming.upstream import UpstreamPool, UpstreamBusy, upstream_pool, upstream_etag, UPSTREAM_CHUNK_SIZE
+from cache.video_prefix_cache import VideoPrefixCache, upstream_span
+from utils.http_range import RangeNotSatisfiable, parse_range, content_range
+
+# Un rango desde 0 más chico que esto es un sondeo del reproductor, no una reproducción
+PLAY_MIN_BYTES = UPSTREAM_CHUNK_SIZE
 
 class VideoStreamer:
-    @staticmethod
-    def stream_video(video_url: str, chunk_size: int = 8192) -> Response | StreamingResponse:
-        """Stream video from external URL through your server"""
+    def __init__(self, pool: UpstreamPool = None, prefix_cache: Optional[VideoPrefixCache] = None):
+        self.pool = pool or upstream_pool
+        self.prefix_cache = prefix_cache
+
+    async def stream_video(self, video_url: str, chunk_size: int = UPSTREAM_CHUNK_SIZE,
+                           range_header: Optional[str] = None) -> Response | StreamingResponse:
+        """
+        Stream video from external URL through your server
+
+        Si el cliente manda `Range`, se reenvía al upstream y se responde 206.
+        Si el upstream ignora el rango (responde 200), el rango se recorta aquí.
+
+        Con `prefix_cache`, los videos populares arrancan desde el prefijo en
+        disco mientras el resto se pide al upstream en paralelo.
+        """
         try:
-            req = requests.get(video_url, stream=True, timeout=30)
-            req.raise_for_status()
-
-            def generate() -> Generator[bytes, None, None]:
-                try:
-                    for chunk in req.iter_content(chunk_size=chunk_size):
-                        if chunk:
-                            yield chunk
-                finally:
-                    req.close()
-
-            return StreamingResponse(
-                generate(),
-                media_type=req.headers.get('content-type', 'video/mp4'),
-                headers={
-                    'Accept-Ranges': 'bytes',
-                    'Content-Length': req.headers.get('content-length'),
-                    'Cache-Control': 'no-cache',
-                }
+            if self.prefix_cache is not None:
+                entry = await asyncio.to_thread(self.prefix_cache.lookup, video_url)
+                if entry:
+                    cached = await self._stream_with_prefix(video_url, entry, range_header, chunk_size)
+                    if cached is not None:
+                        return cached
+
+            tap = None
+            if self.prefix_cache is not None and self._is_play(range_header):
+                if self.prefix_cache.record_play(video_url):
+                    tap = lambda upstream, chunks: self.prefix_cache.capture(video_url, upstream, chunks)
+
+            return await self.pool.proxy(
+                video_url,
+                range_header=range_header,
+                default_media_type='video/mp4',
+                headers={'Cache-Control': 'no-cache'},
+                chunk_size=chunk_size,
+                tap=tap
             )
 
-        except requests.exceptions.RequestException as e:
+        except UpstreamBusy as e:
+            print(f"Video streaming error: {e}")
+            return Response(
+                content=f"Error streaming video: {str(e)}",
+                status_code=503,
+                media_type="text/plain",
+                headers={'Retry-After': '5'}
+            )
+        except httpx.HTTPError as e:
             print(f"Video streaming error: {e}")
             return Response(
                 content=f"Error streaming video: {str(e)}",
@@ -41,4 +69,126 @@ class VideoStreamer:
                 content="Error streaming video: Internal server error",
                 status_code=500,
                 media_type="text/plain"
-            )
\ No newline at end of file
+            )
+
+    @staticmethod
+    def _is_play(range_header: Optional[str]) -> bool:
+        """
+        True si la petición es una reproducción desde el inicio: sin rango, o un
+        rango desde el byte 0 abierto o de al menos `PLAY_MIN_BYTES` (un
+        `bytes=0-1` para conocer el tamaño no cuenta).
+        """
+        try:
+            byte_range = parse_range(range_header, None)
+        except RangeNotSatisfiable:
+            return False
+        if byte_range is None:
+            return True
+        start, end = byte_range
+        return start == 0 and (end is None or end + 1 >= PLAY_MIN_BYTES)
+
+    async def _stream_with_prefix(self, video_url: str, entry: Dict, range_header: Optional[str],
+                                  chunk_size: int) -> Optional[Response]:
+        """
+        Sirve el rango pedido uniendo el prefijo local con el resto del upstream.
+        Devuelve None si el rango empieza después del prefijo (va directo al upstream).
+        """
+        total = entry['total_size']
+        prefix_len = entry['prefix_len']
+        try:
+            byte_range = parse_range(range_header, total)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={'Content-Range': f"bytes */{total}"})
+
+        start, end = byte_range or (0, total - 1)
+        if start >= prefix_len:
+            return None
+        if self._is_play(range_header):
+            self.prefix_cache.record_play(video_url)
+
+        # El resto se pide ya, mientras el cliente recibe el prefijo desde disco
+        rest = None
+        if end >= prefix_len:
+            rest = asyncio.create_task(
+                self.pool.open(video_url, headers={'Range': f"bytes={prefix_len}-{end}"})
+            )
+
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Cache-Control': 'no-cache',
+            'Content-Length': str(end - start + 1)
+        }
+        if entry.get('etag'):
+            headers['ETag'] = entry['etag']
+        if byte_range:
+            headers['Content-Range'] = content_range(start, end, total)
+
+        return StreamingResponse(
+            self._spliced_body(video_url, entry['path'], start, end, prefix_len, total, rest, chunk_size,
+                               entry.get('etag')),
+            status_code=206 if byte_range else 200,
+            media_type=entry['content_type'],
+            headers=headers
+        )
+
+    async def _spliced_body(self, video_url: str, path, start: int, end: int, prefix_len: int,
+                            total: int, rest: Optional[asyncio.Task], chunk_size: int,
+                            entry_etag: Optional[str] = None):
+        try:
+            async with await anyio.open_file(path, 'rb') as f:
+                await f.seek(start)
+                remaining = min(end, prefix_len - 1) - start + 1
+                while remaining > 0:
+                    chunk = await f.read(min(chunk_size, remaining))
+                    if not chunk:
+                        raise IOError(f"Prefijo de video truncado: {path}")
+                    remaining -= len(chunk)
+                    yield chunk
+
+            if rest is None:
+                return
+
+            upstream = await rest
+            if upstream.status_code != 206:
+                # Upstream sin soporte de rangos: nunca se baja el recurso completo
+                # para descartar el prefijo; el prefijo no sirve y se borra
+                await self.pool.close(upstream)
+                await asyncio.to_thread(self.prefix_cache.invalidate, video_url)
+                raise IOError(f"Upstream ignoró el Range, prefijo descartado: {video_url}")
+            upstream_start, upstream_total = upstream_span(upstream)
+            etag = upstream_etag(upstream)
+            changed = etag and entry_etag and etag.removeprefix('W/') != entry_etag.removeprefix('W/')
+            if upstream_total != total or upstream_start != prefix_len or changed:
+                # El video cambió en el origen: el prefijo ya no corresponde
+                await self.pool.close(upstream)
+                await asyncio.to_thread(self.prefix_cache.invalidate, video_url)
+                raise IOError(f"Video cambió en el upstream, prefijo descartado: {video_url}")
+
+            chunks = self.pool.relay(upstream, chunk_size=chunk_size)
+            remaining = end - prefix_len + 1
+            try:
+                async for chunk in chunks:
+                    chunk = chunk[:remaining]
+                    remaining -= len(chunk)
+                    yield chunk
+                    if remaining <= 0:
+                        break
+            finally:
+                await chunks.aclose()
+                # Explícito: no se depende del cierre en cadena de los generadores
+                await self.pool.close(upstream)
+            if remaining > 0:
+                raise IOError(f"Upstream cortó el video a {remaining} bytes del final: {video_url}")
+
+        except Exception as e:
+            # Los headers (con Content-Length) ya salieron: se corta la conexión para
+            # que el cliente vea la respuesta incompleta en vez de un final limpio
+            print(f"Video streaming error, respuesta abortada: {e}")
+            raise
+        finally:
+            if rest is not None:
+                if not rest.done():
+                    rest.cancel()
+                elif not rest.cancelled() and rest.exception() is None:
+                    # close() es idempotente: libera el lugar del host si el relay no llegó a hacerlo
+                    await self.pool.close(rest.result())
@@ -0,0 +1,248 @@
+import json
+import zlib
+from typing import Any, Dict, Optional
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Tipos que vale la pena comprimir (PDFs, video e imágenes ya vienen comprimidos)
+COMPRESSIBLE_TYPES = (
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'text/',
+    'image/svg+xml',
+)
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Para variantes guardadas en cache se paga la compresión una vez: calidad máxima
+PRECOMPRESS_GZIP_LEVEL = 9
+PRECOMPRESS_BROTLI_QUALITY = 11
+
+
+def available_encodings() -> list:
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Elige br o gzip según el header Accept-Encoding (respeta q=0)"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        fields = part.strip().split(';')
+        name = fields[0].strip().lower()
+        q = 1.0
+        for param in fields[1:]:
+            param = param.strip()
+            if param.startswith('q='):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """Comprime un cuerpo completo con gzip o brotli"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    compressor = zlib.compressobj(GZIP_LEVEL if level is None else level, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+class StreamEncoder:
+    """Compresión incremental para respuestas en streaming"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        # Se vacía el buffer en cada trozo para no retrasar el stream al cliente
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def _is_compressible(content_type: str) -> bool:
+    content_type = content_type.lower()
+    return any(content_type.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+
+def _with_vary(headers: list) -> list:
+    """Headers (str, minúsculas) con Accept-Encoding en `Vary`, sin repetirlo"""
+    vary = ', '.join(v for k, v in headers if k == 'vary')
+    if vary.strip() == '*' or 'accept-encoding' in vary.lower():
+        return headers
+    headers = [(k, v) for k, v in headers if k != 'vary']
+    headers.append(('vary', f"{vary}, Accept-Encoding" if vary else 'Accept-Encoding'))
+    return headers
+
+
+def _start_with_vary(start: dict) -> dict:
+    """
+    `http.response.start` con `Vary: Accept-Encoding` si el tipo es comprimible:
+    la respuesta depende de ese header aunque esta vez no se haya comprimido,
+    y una cache compartida no debe mezclar variantes.
+    """
+    headers = [(k.decode('latin-1').lower(), v.decode('latin-1')) for k, v in start['headers']]
+    if not _is_compressible(dict(headers).get('content-type', '')):
+        return start
+    start = dict(start)
+    start['headers'] = [(k.encode('latin-1'), v.encode('latin-1')) for k, v in _with_vary(headers)]
+    return start
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI que negocia gzip/brotli con el cliente.
+
+    No toca respuestas que ya traen Content-Encoding (p. ej. variantes
+    precomprimidas de la cache), ni rangos (206), ni tipos no comprimibles,
+    ni cuerpos menores a `minimum_size`, ni archivos enviados por
+    zerocopy/pathsend. Toda respuesta de tipo comprimible lleva
+    `Vary: Accept-Encoding`, se haya comprimido o no.
+    """
+
+    def __init__(self, app, minimum_size: int = 500):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict((k.decode('latin-1').lower(), v.decode('latin-1')) for k, v in scope.get('headers', []))
+        encoding = negotiate_encoding(headers.get('accept-encoding'))
+        if not encoding:
+            async def send_with_vary(message):
+                if message['type'] == 'http.response.start':
+                    message = _start_with_vary(message)
+                await send(message)
+
+            await self.app(scope, receive, send_with_vary)
+            return
+
+        state = {'start': None, 'encoder': None, 'passthrough': False}
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start':
+                state['start'] = message
+                return
+
+            if message['type'] != 'http.response.body' or state['passthrough']:
+                if not state['passthrough'] and state['encoder'] is None:
+                    # zerocopy/pathsend: el archivo va tal cual; se libera el start retenido
+                    state['passthrough'] = True
+                    await send(_start_with_vary(state['start']))
+                await send(message)
+                return
+
+            if state['encoder'] is not None:
+                body = state['encoder'].compress(message.get('body', b''))
+                if not message.get('more_body', False):
+                    body += state['encoder'].finish()
+                await send({'type': 'http.response.body', 'body': body,
+                            'more_body': message.get('more_body', False)})
+                return
+
+            # Primer trozo del cuerpo: se decide si comprimir
+            start = state['start']
+            response_headers = [(k.decode('latin-1').lower(), v.decode('latin-1')) for k, v in start['headers']]
+            names = {k: v for k, v in response_headers}
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+            skip = (
+                'content-encoding' in names
+                or 'content-range' in names
+                or start['status'] in (204, 206, 304)
+                or not _is_compressible(names.get('content-type', ''))
+                or (not more_body and len(body) < self.minimum_size)
+            )
+            if skip:
+                state['passthrough'] = True
+                await send(_start_with_vary(start))
+                await send(message)
+                return
+
+            new_headers = [(k, v) for k, v in response_headers if k not in ('content-length', 'etag')]
+            if 'etag' in names:
+                # La representación comprimida es otra: la ETag pasa a ser débil
+                new_headers.append(('etag', names['etag'] if names['etag'].startswith('W/') else f"W/{names['etag']}"))
+            new_headers.append(('content-encoding', encoding))
+            new_headers = _with_vary(new_headers)
+
+            if more_body:
+                state['encoder'] = StreamEncoder(encoding)
+                compressed = state['encoder'].compress(body)
+            else:
+                compressed = compress(body, encoding)
+                new_headers.append(('content-length', str(len(compressed))))
+
+            start = dict(start)
+            start['headers'] = [(k.encode('latin-1'), v.encode('latin-1')) for k, v in new_headers]
+            await send(start)
+            await send({'type': 'http.response.body', 'body': compressed, 'more_body': more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# ==================== VARIANTES PRECOMPRIMIDAS ====================
+
+def serialize_json(payload: Any) -> bytes:
+    """Mismo formato que JSONResponse de FastAPI"""
+    return json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+
+
+def variant_key(key: str, digest: str, encoding: str) -> str:
+    # El hash del contenido va en la key: una variante nunca queda desfasada
+    return f"{key}:body:{digest[:16]}:{encoding}"
+
+
+def store_precompressed(cache, key: str, digest: str, payload: Any, ttl: int) -> bool:
+    """Guarda el cuerpo JSON de una respuesta cacheada ya comprimido en cada codificación"""
+    body = serialize_json(payload)
+    variants = {}
+    for encoding in available_encodings():
+        level = PRECOMPRESS_BROTLI_QUALITY if encoding == 'br' else PRECOMPRESS_GZIP_LEVEL
+        variants[variant_key(key, digest, encoding)] = compress(body, encoding, level)
+    return cache.set_many(variants, ttl)
+
+
+def precompressed_response(cache, key: str, digest: str, accept_encoding: Optional[str],
+                           headers: Optional[Dict[str, str]] = None):
+    """Response con la variante precomprimida que acepta el cliente, o None si no hay"""
+    encoding = negotiate_encoding(accept_encoding)
+    if not encoding:
+        return None
+    body = cache.get(variant_key(key, digest, encoding))
+    if not body:
+        return None
+    return Response(
+        content=body,
+        media_type='application/json',
+        headers={'Content-Encoding': encoding, 'Vary': 'Accept-Encoding', **(headers or {})}
+    )
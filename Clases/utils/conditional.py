@@ -0,0 +1,37 @@
+import json
+import hashlib
+from typing import Any, Dict, Optional
+from fastapi.responses import Response
+
+
+def make_etag(digest: str) -> str:
+    """ETag fuerte a partir de un hash de contenido"""
+    return f'"{digest}"'
+
+
+def json_digest(value: Any) -> str:
+    """sha256 de un valor JSON en forma canónica (mismo contenido -> mismo hash)"""
+    canonical = json.dumps(value, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def body_etag(body: bytes) -> str:
+    """ETag fuerte del cuerpo exacto que se envía"""
+    return make_etag(hashlib.sha256(body).hexdigest())
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    """True si el header `If-None-Match` del cliente incluye `etag` (o es `*`)"""
+    header = if_none_match
+    if not header or not etag:
+        return False
+    if header.strip() == '*':
+        return True
+    # If-None-Match usa comparación débil: se ignora el prefijo W/
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return etag.removeprefix('W/') in candidates
+
+
+def not_modified(etag: str, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Respuesta 304 sin cuerpo"""
+    return Response(status_code=304, headers={'ETag': etag, **(headers or {})})
@@ -0,0 +1,77 @@
+from typing import AsyncIterator, Optional, Tuple
+
+
+class RangeNotSatisfiable(Exception):
+    """El rango pedido cae fuera del recurso (HTTP 416)"""
+    pass
+
+
+def parse_range(header: Optional[str], size: Optional[int]) -> Optional[Tuple[int, Optional[int]]]:
+    """
+    Interpreta un header `Range: bytes=...` de un solo rango.
+
+    Args:
+        header: Valor del header Range (o None)
+        size: Tamaño total del recurso si se conoce
+
+    Returns:
+        (start, end) inclusivos; `end` es None si el rango es abierto y no se
+        conoce el tamaño. None si no hay rango utilizable (sin header, sintaxis
+        inválida o múltiples rangos): se responde el recurso completo.
+
+    Raises:
+        RangeNotSatisfiable: si el rango no se puede satisfacer
+    """
+    if not header or not header.strip().lower().startswith('bytes='):
+        return None
+    spec = header.strip()[6:].strip()
+    if ',' in spec or '-' not in spec:
+        return None
+
+    first, last = (part.strip() for part in spec.split('-', 1))
+    try:
+        if first == '':
+            # Sufijo: los últimos N bytes
+            if size is None or last == '':
+                return None
+            length = int(last)
+            if length <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(size - length, 0), size - 1
+
+        start = int(first)
+        end = int(last) if last else None
+    except ValueError:
+        return None
+
+    if end is not None and end < start:
+        return None
+    if size is not None:
+        if start >= size:
+            raise RangeNotSatisfiable(header)
+        end = size - 1 if end is None else min(end, size - 1)
+    return start, end
+
+
+def content_range(start: int, end: int, size: Optional[int]) -> str:
+    """Valor del header Content-Range para una respuesta 206"""
+    return f"bytes {start}-{end}/{size if size is not None else '*'}"
+
+
+async def slice_stream(chunks: AsyncIterator[bytes], start: int, end: Optional[int]) -> AsyncIterator[bytes]:
+    """
+    Recorta un stream de bytes al rango [start, end] (inclusivo). Sirve para
+    emular un 206 cuando el upstream ignora el header Range y manda todo.
+    """
+    pos = 0
+    try:
+        async for chunk in chunks:
+            lo = max(start - pos, 0)
+            hi = len(chunk) if end is None else min(end + 1 - pos, len(chunk))
+            if lo < hi:
+                yield chunk[lo:hi]
+            pos += len(chunk)
+            if end is not None and pos > end:
+                break
+    finally:
+        await chunks.aclose()
@@ -0,0 +1,61 @@
+from typing import List, Optional
+
+
+class PageRangeError(ValueError):
+    """Rango de páginas inválido o fuera del documento"""
+    pass
+
+
+def parse_pages(spec: Optional[str], page_count: int) -> List[int]:
+    """
+    Interpreta un rango de páginas estilo impresora: "3-7", "1,4,9-12", "5-".
+
+    Args:
+        spec: Rango pedido (páginas desde 1). Vacío o None = todas
+        page_count: Páginas del documento
+
+    Returns:
+        Índices de página desde 0, en el orden pedido y sin repetidos
+
+    Raises:
+        PageRangeError: si la sintaxis es inválida o alguna página no existe
+    """
+    if not spec or not spec.strip():
+        return list(range(page_count))
+
+    pages: List[int] = []
+    seen = set()
+    for part in spec.replace(' ', '').split(','):
+        if not part:
+            continue
+        first, sep, last = part.partition('-')
+        try:
+            start = int(first) if first else 1
+            end = (int(last) if last else page_count) if sep else start
+        except ValueError:
+            raise PageRangeError(f"Rango de páginas inválido: '{part}'")
+        if start < 1 or end < start:
+            raise PageRangeError(f"Rango de páginas inválido: '{part}'")
+        if end > page_count:
+            raise PageRangeError(f"El documento tiene {page_count} páginas (pedido: '{part}')")
+        for page in range(start - 1, end):
+            if page not in seen:
+                seen.add(page)
+                pages.append(page)
+
+    if not pages:
+        raise PageRangeError(f"Rango de páginas vacío: '{spec}'")
+    return pages
+
+
+def format_pages(pages: List[int]) -> str:
+    """Forma canónica de una lista de índices (desde 0): [2,3,4,9] -> "3-5,10" """
+    parts = []
+    i = 0
+    while i < len(pages):
+        j = i
+        while j + 1 < len(pages) and pages[j + 1] == pages[j] + 1:
+            j += 1
+        parts.append(str(pages[i] + 1) if i == j else f"{pages[i] + 1}-{pages[j] + 1}")
+        i = j + 1
+    return ','.join(parts)
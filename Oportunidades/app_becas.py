@@ -12,6 +12,7 @@ import os
 
 from routes.auth_routes import router as auth_router
 from routes.scholarship_routes import router as scholarship_router
+from utils.compression import CompressionMiddleware
 
 # 🔥 Cargar variables de entorno
 load_dotenv()
@@ -69,6 +70,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresión gzip/brotli según Accept-Encoding
+app.add_middleware(CompressionMiddleware, minimum_size=500)
+
 # Incluir routers
 app.include_router(auth_router)
 app.include_router(scholarship_router)